@@ -0,0 +1,278 @@
+"""
+End-to-end cycle-time benchmark for the station state machines.
+
+Drives State1 -> State4 of station1, station2 and station3 for many simulated
+bottles against a scripted reader and synthetic databases of several sizes,
+then reports p50/p95/p99 cycle time, time per state and throughput.
+
+Usage (from the repository root):
+
+    python benchmarks/bench_cycles.py --cycles 2000 --sizes 1000 10000 100000
+    python benchmarks/bench_cycles.py --compare benchmarks/results/cycle_<commit>.json
+
+The synthetic databases and the log are written to temporary directories that
+are removed afterwards; --keep leaves them in place for inspection.
+"""
+import argparse
+import contextlib
+import datetime
+import importlib
+import json
+import logging
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.join(BASE_DIR, '..', 'src')
+RESULTS_DIR = os.path.join(BASE_DIR, 'results')
+
+sys.path.insert(0, BASE_DIR)
+sys.path.insert(0, SRC_DIR)
+
+import fake_reader  # noqa: E402
+import synthetic_db  # noqa: E402
+
+END_STATES = ('State4', 'State5')
+BOTTLE_BLOCK = 2
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+def summarize(samples):
+    """Summary in milliseconds of a list of durations in seconds."""
+    values = sorted(samples)
+    if not values:
+        return {'count': 0}
+    return {
+        'count': len(values),
+        'mean': 1000 * sum(values) / len(values),
+        'p50': 1000 * percentile(values, 0.50),
+        'p95': 1000 * percentile(values, 0.95),
+        'p99': 1000 * percentile(values, 0.99),
+        'max': 1000 * values[-1],
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=BASE_DIR, stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def load_station(name, workdir):
+    module = importlib.import_module(name)
+    module.DB_PATH = os.path.join(workdir, 'flaschen_database.db')
+    if hasattr(module, 'QR_DIR'):
+        module.QR_DIR = os.path.join(workdir, 'QR_CODES')
+        os.makedirs(module.QR_DIR, exist_ok=True)
+    return module
+
+
+def prepare(station, reader, cycles, size, seed):
+    """Create the database for one run and queue the cards for every cycle."""
+    workdir = tempfile.mkdtemp(prefix=f'bench_{station}_')
+    db_path = os.path.join(workdir, 'flaschen_database.db')
+
+    if station == 'station1':
+        # Station 1 taggt: alle Flaschen ungetaggt, jede Karte ist leer
+        synthetic_db.build_database(db_path, bottles=size, tagged=0, seed=seed)
+        cycles = min(cycles, size)
+        for cycle in range(cycles):
+            reader.present(cycle.to_bytes(4, 'big'))
+    else:
+        # Station 2/3: Flaschen sind getaggt, UID bekannt; Block 2 trägt die Flaschen-ID (1 Byte) als Fallback
+        synthetic_db.build_database(db_path, bottles=size, tagged=size, seed=seed)
+        for cycle in range(cycles):
+            flaschen_id = cycle % size + 1
+            block = bytearray(fake_reader.BLOCK_SIZE)
+            block[0] = flaschen_id & 0xFF
+            reader.present(synthetic_db.bottle_uid(flaschen_id), {BOTTLE_BLOCK: block})
+    return workdir, cycles
+
+
+def run_cycle(machine, state_samples):
+    """Run one bottle from State1 until it is done, failed or back at State1."""
+    machine.current_state = 'State1'
+    start = time.perf_counter()
+    steps = 0
+    while True:
+        name = machine.current_state
+        if name in END_STATES or (name == 'State1' and steps):
+            break
+        state_samples.setdefault(name, []).append(machine.run_state(name))  # inkl. Production_Event-Puffer
+        steps += 1
+    return time.perf_counter() - start, name
+
+
+def bench_station(station, size, cycles, timings, miss_rate, error_rate, seed, write_behind=False, cards_in_field=1,
+                  keep=False):
+    reader = fake_reader.ScriptedReader(timings=timings, miss_rate=miss_rate, error_rate=error_rate, seed=seed,
+                                        in_field=cards_in_field)
+    workdir, cycles = prepare(station, reader, cycles, size, seed)
+    try:
+        return run_station(station, workdir, reader, size, cycles, write_behind)
+    finally:
+        if not keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def run_station(station, workdir, reader, size, cycles, write_behind):
+    module = load_station(station, workdir)
+
+    machine = module.StateMachine()
+    machine.reader = reader
+    if write_behind and machine.db.writable and not machine.db.read_only:
+        machine.db.enable_journal()  # nur die schreibende Station (station1) hat ein Journal
+
+    cycle_samples = []
+    state_samples = {}
+    outcomes = {'ok': 0, 'failed': 0, 'retry': 0}
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        wall_start = time.perf_counter()
+        for _ in range(cycles):
+            duration, end_state = run_cycle(machine, state_samples)
+            cycle_samples.append(duration)
+            if end_state == 'State4':
+                outcomes['ok'] += 1
+            elif end_state == 'State5':
+                outcomes['failed'] += 1
+            else:
+                outcomes['retry'] += 1
+        wall = time.perf_counter() - wall_start
+    machine.ledger.stop()  # letzte Production_Events schreiben, solange die Datenbank noch existiert
+    if machine.ledger.db is not machine.db:
+        machine.ledger.db.close()
+    machine.db.close()
+
+    return {
+        'station': station,
+        'size': size,
+        'cycles': cycles,
+        'outcomes': outcomes,
+        'cycle_ms': summarize(cycle_samples),
+        'state_ms': {name: summarize(samples) for name, samples in sorted(state_samples.items())},
+        'throughput_per_s': cycles / wall if wall else 0.0,
+    }
+
+
+def print_result(result):
+    cycle = result['cycle_ms']
+    print(
+        f"{result['station']:<9} size={result['size']:<8} cycles={result['cycles']:<6} "
+        f"p50={cycle['p50']:.2f}ms p95={cycle['p95']:.2f}ms p99={cycle['p99']:.2f}ms "
+        f"throughput={result['throughput_per_s']:.1f}/s outcomes={result['outcomes']}"
+    )
+    for name, stats in result['state_ms'].items():
+        print(f"    {name}: mean={stats['mean']:.3f}ms p50={stats['p50']:.3f}ms p95={stats['p95']:.3f}ms p99={stats['p99']:.3f}ms")
+
+
+def compare(previous_path, results):
+    with open(previous_path, encoding='utf-8') as f:
+        previous = json.load(f)
+    old = {(r['station'], r['size']): r for r in previous['results']}
+    print(f"\nComparison against {previous_path} (commit {previous['meta'].get('commit')}):")
+    for result in results:
+        before = old.get((result['station'], result['size']))
+        if before is None:
+            continue
+        deltas = []
+        for key in ('p50', 'p95', 'p99'):
+            a, b = before['cycle_ms'][key], result['cycle_ms'][key]
+            deltas.append(f"{key} {a:.2f} -> {b:.2f}ms ({(b - a) / a * 100 if a else 0:+.1f}%)")
+        a, b = before['throughput_per_s'], result['throughput_per_s']
+        deltas.append(f"throughput {a:.1f} -> {b:.1f}/s ({(b - a) / a * 100 if a else 0:+.1f}%)")
+        print(f"  {result['station']} size={result['size']}: " + ', '.join(deltas))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--stations', nargs='+', default=['station1', 'station2', 'station3'])
+    parser.add_argument('--sizes', nargs='+', type=int, default=[1000, 10000, 100000],
+                        help='Number of bottles in the synthetic database')
+    parser.add_argument('--cycles', type=int, default=1000, help='Simulated bottles per station and size')
+    parser.add_argument('--spi-scale', type=float, default=1.0,
+                        help='Multiply all simulated SPI timings (0 = measure software only)')
+    parser.add_argument('--poll-ms', type=float, default=5.0)
+    parser.add_argument('--auth-ms', type=float, default=3.0)
+    parser.add_argument('--read-ms', type=float, default=3.0)
+    parser.add_argument('--write-ms', type=float, default=6.0)
+    parser.add_argument('--miss-rate', type=float, default=0.0, help='Share of empty polls before a card')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Share of failing block operations')
+    parser.add_argument('--cards-in-field', type=int, default=1, choices=[1, 2],
+                        help='Cards one PN532 poll can detect at once (2 = back-to-back bottles)')
+    parser.add_argument('--write-behind', action='store_true', help='Route station1 writes through the write-behind journal')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='JSON result file (default: benchmarks/results/cycle_<commit>.json)')
+    parser.add_argument('--compare', help='Earlier JSON result file to compare against')
+    parser.add_argument('--keep', action='store_true', help='Keep the synthetic databases and the log')
+    args = parser.parse_args(argv)
+
+    timings = fake_reader.SpiTimings(
+        poll=args.poll_ms / 1000, auth=args.auth_ms / 1000, read=args.read_ms / 1000, write=args.write_ms / 1000
+    ).scaled(args.spi_scale)
+
+    # Logging bleibt aktiv (die Kosten gehören zum Zyklus), schreibt aber nicht in src/*.log
+    log_dir = tempfile.mkdtemp(prefix='bench_logs_')
+    logging.basicConfig(filename=os.path.join(log_dir, 'bench.log'), encoding='utf-8', level=logging.DEBUG, force=True)
+
+    commit = git_commit()
+    results = []
+    try:
+        for station in args.stations:
+            for size in args.sizes:
+                try:
+                    result = bench_station(station, size, args.cycles, timings, args.miss_rate, args.error_rate,
+                                           args.seed, args.write_behind, args.cards_in_field, args.keep)
+                except ImportError as e:
+                    print(f"{station}: skipped ({e})")
+                    break
+                print_result(result)
+                results.append(result)
+    finally:
+        logging.shutdown()
+        if args.keep:
+            print(f"Databases and log kept in {tempfile.gettempdir()} (bench_*), log: {log_dir}")
+        else:
+            shutil.rmtree(log_dir, ignore_errors=True)
+
+    report = {
+        'meta': {
+            'commit': commit,
+            'created': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cycles': args.cycles,
+            'seed': args.seed,
+            'miss_rate': args.miss_rate,
+            'error_rate': args.error_rate,
+            'write_behind': args.write_behind,
+            'cards_in_field': args.cards_in_field,
+            'spi_timings_s': timings.as_dict(),
+        },
+        'results': results,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f'cycle_{commit}.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {output}")
+
+    if args.compare:
+        compare(args.compare, results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""
+Scripted stand-in for NFCReader used by the cycle benchmarks.
+
+Cards are queued with present() and handed out by read_passive_target() /
+read_passive_targets() in order; in_field sets how many queued cards one
+multi-target poll can see at once. Every PN532 command sleeps for a configurable time so that the SPI
+round trips of the real reader show up in the measured cycle times.
+"""
+import random
+import time
+from collections import deque
+
+BLOCK_SIZE = 16
+
+
+class SpiTimings:
+    """Simulated duration (seconds) of the PN532 commands used by the stations."""
+
+    def __init__(self, poll=0.005, poll_miss=0.05, auth=0.003, read=0.003, write=0.006):
+        self.poll = poll            # read_passive_target mit Karte im Feld
+        self.poll_miss = poll_miss  # read_passive_target ohne Karte (Timeout)
+        self.auth = auth            # mifare_classic_authenticate_block
+        self.read = read            # mifare_classic_read_block
+        self.write = write          # mifare_classic_write_block
+
+    def scaled(self, factor):
+        return SpiTimings(*(value * factor for value in self.as_tuple()))
+
+    def as_tuple(self):
+        return (self.poll, self.poll_miss, self.auth, self.read, self.write)
+
+    def as_dict(self):
+        return dict(zip(("poll", "poll_miss", "auth", "read", "write"), self.as_tuple()))
+
+
+class ScriptedReader:
+    def __init__(self, timings=None, miss_rate=0.0, error_rate=0.0, seed=0, in_field=1):
+        self.timings = timings or SpiTimings()
+        self.in_field = in_field        # Karten gleichzeitig im Feld (max. für InListPassiveTarget)
+        self.miss_rate = miss_rate      # Anteil leerer Polls vor jeder Karte
+        self.error_rate = error_rate    # Anteil fehlgeschlagener Block-Operationen
+        self._random = random.Random(seed)
+        self._queue = deque()
+        self.tags = {}
+
+    def present(self, uid, blocks=None):
+        """Queue a card; blocks maps block numbers to 16 byte payloads."""
+        uid = bytes(uid)
+        tag = self.tags.setdefault(uid, {})
+        if blocks:
+            tag.update({number: bytes(data) for number, data in blocks.items()})
+        self._queue.append(uid)
+
+    @staticmethod
+    def _sleep(seconds):
+        if seconds > 0:
+            time.sleep(seconds)
+
+    def config(self):
+        return self
+
+    def read_passive_target(self, timeout=1):
+        if not self._queue or self._random.random() < self.miss_rate:
+            self._sleep(min(timeout, self.timings.poll_miss))
+            return None
+        self._sleep(self.timings.poll)
+        return bytearray(self._queue.popleft())
+
+    def read_passive_targets(self, max_targets=2, timeout=1):
+        if not self._queue or self._random.random() < self.miss_rate:
+            self._sleep(min(timeout, self.timings.poll_miss))
+            return []
+        self._sleep(self.timings.poll)
+        count = min(max_targets, self.in_field, len(self._queue))
+        return [bytearray(self._queue.popleft()) for _ in range(count)]
+
+    def read_block(self, uid, block_number, target=1):
+        self._sleep(self.timings.auth + self.timings.read)
+        if self._random.random() < self.error_rate:
+            return None
+        return bytearray(self.tags.get(bytes(uid), {}).get(block_number, bytes(BLOCK_SIZE)))
+
+    def read_all_blocks(self, uid):
+        return [self.read_block(uid, block_number) for block_number in range(64)]
+
+    def write_block(self, uid, block_number, data, target=1):
+        self._sleep(self.timings.auth + self.timings.write)
+        if self._random.random() < self.error_rate:
+            return False
+        self.tags.setdefault(bytes(uid), {})[block_number] = bytes(data)
+        return True
@@ -0,0 +1,103 @@
+"""
+Startup-time report for the station modules based on `python -X importtime`.
+
+Every measurement runs in a fresh interpreter. For each station it reports the
+wall time of `import stationN`, the slowest imports from the importtime log,
+and the cost of the deferred dependencies (PN532/Blinka stack, sqlite3,
+qrcode) that are now only loaded on the code path that needs them.
+
+    python benchmarks/startup_report.py [--top 10] [--output startup.json]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.abspath(os.path.join(BASE_DIR, '..', 'src'))
+
+STATIONS = ('station1', 'station2', 'station3')
+DEFERRED_MODULES = ('board', 'busio', 'digitalio', 'adafruit_pn532.spi', 'sqlite3', 'qrcode')
+
+
+def importtime(module):
+    """Import module in a fresh interpreter; returns (wall seconds, parsed rows or error)."""
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=SRC_DIR, capture_output=True, text=True,
+    )
+    wall = time.perf_counter() - start
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = (part.strip() for part in line[len('import time:'):].split('|'))
+        rows.append({'module': name.strip(), 'self_us': int(self_us), 'cumulative_us': int(cumulative_us)})
+    if proc.returncode != 0:
+        return wall, {'error': proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else 'failed'}
+    return wall, rows
+
+
+def baseline():
+    """Wall time of a bare interpreter start, subtracted from the module numbers."""
+    start = time.perf_counter()
+    subprocess.run([sys.executable, '-c', 'pass'], check=True)
+    return time.perf_counter() - start
+
+
+def report_module(module, interpreter, top):
+    wall, rows = importtime(module)
+    if isinstance(rows, dict):
+        return {'module': module, **rows}
+    own = next((row for row in rows if row['module'] == module), None)
+    slowest = sorted(rows, key=lambda row: row['self_us'], reverse=True)[:top]
+    return {
+        'module': module,
+        'wall_ms': wall * 1000,
+        'wall_minus_interpreter_ms': (wall - interpreter) * 1000,
+        'cumulative_ms': own['cumulative_us'] / 1000 if own else None,
+        'slowest_imports': slowest,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--top', type=int, default=10, help='Number of slowest imports to list per station')
+    parser.add_argument('--output', help='Write the report as JSON')
+    args = parser.parse_args(argv)
+
+    interpreter = baseline()
+    print(f"bare interpreter start: {interpreter * 1000:.1f} ms\n")
+
+    report = {'interpreter_ms': interpreter * 1000, 'stations': [], 'deferred': []}
+    for station in STATIONS:
+        result = report_module(station, interpreter, args.top)
+        report['stations'].append(result)
+        if 'error' in result:
+            print(f"{station}: import failed ({result['error']})")
+            continue
+        print(f"{station}: import {result['cumulative_ms']:.1f} ms, "
+              f"process {result['wall_ms']:.1f} ms (+{result['wall_minus_interpreter_ms']:.1f} ms over bare start)")
+        for row in result['slowest_imports']:
+            print(f"    {row['self_us'] / 1000:8.2f} ms self {row['cumulative_us'] / 1000:8.2f} ms cumulative  {row['module']}")
+
+    print("\ndeferred dependencies (loaded on first use / by station_daemon.py):")
+    for module in DEFERRED_MODULES:
+        result = report_module(module, interpreter, 0)
+        report['deferred'].append(result)
+        if 'error' in result:
+            print(f"    {module:<20} not available ({result['error']})")
+        else:
+            print(f"    {module:<20} {result['cumulative_ms']:8.1f} ms")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""
+Build throwaway copies of the station database filled with synthetic data.
+
+The schema is copied from data/flaschen_database.db so the benchmarks always
+run against the same tables and indexes as the stations on the line.
+"""
+import datetime
+import os
+import random
+import sqlite3
+import sys
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SOURCE_DB = os.path.join(BASE_DIR, '..', 'data', 'flaschen_database.db')
+
+sys.path.insert(0, os.path.join(BASE_DIR, '..', 'src'))
+
+import database  # noqa: E402
+
+RECIPE_COUNT = 3
+DISPENSER_COUNT = 3
+GRANULATE_COUNT = 3
+
+
+def copy_schema(target_path, source_path=SOURCE_DB):
+    source = sqlite3.connect(source_path)
+    try:
+        statements = [
+            row[0] for row in source.execute(
+                "SELECT sql FROM sqlite_master "
+                "WHERE sql IS NOT NULL AND name NOT LIKE 'sqlite_%' "
+                "ORDER BY type = 'index', rowid"
+            )
+        ]
+    finally:
+        source.close()
+
+    conn = sqlite3.connect(target_path)
+    try:
+        for statement in statements:
+            conn.execute(statement)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def bottle_uid(flaschen_id):
+    return flaschen_id.to_bytes(4, 'big')
+
+
+def build_database(path, bottles, tagged=0, seed=0):
+    """
+    Create a database at path with `bottles` rows in Flasche.
+
+    The first `tagged` bottles carry a Tagged_Date, the rest are untagged
+    (Tagged_Date = 0) just like freshly planned bottles in production.
+    """
+    if os.path.exists(path):
+        os.remove(path)
+    copy_schema(path)
+
+    # Wie beim ersten Start einer schreibenden Station: WAL-Modus und Schema-Ergänzungen
+    db = database.Database(path)
+    db.connection()
+    db.close()
+
+    rng = random.Random(seed)
+    start = datetime.datetime(2024, 12, 4, 8, 0, 0)
+
+    conn = sqlite3.connect(path)
+    try:
+        conn.executemany(
+            "INSERT INTO Rezept (Rezept_ID, Stueckzahl) VALUES (?, ?)",
+            [(rezept_id, rng.randint(10, 20)) for rezept_id in range(1, RECIPE_COUNT + 1)],
+        )
+        conn.executemany(
+            "INSERT INTO Rezept_besteht_aus_Granulat (Rezept_ID, Granulat_ID, Menge) VALUES (?, ?, ?)",
+            [
+                (rezept_id, rng.randint(1, GRANULATE_COUNT), float(rng.randint(1, 50)))
+                for rezept_id in range(1, RECIPE_COUNT + 1)
+                for _ in range(3)
+            ],
+        )
+        conn.executemany(
+            "INSERT INTO Flasche (Flaschen_ID, Rezept_ID, Tagged_Date, has_error) VALUES (?, ?, ?, ?)",
+            (
+                (
+                    flaschen_id,
+                    rng.randint(1, RECIPE_COUNT),
+                    str(start + datetime.timedelta(seconds=30 * flaschen_id)) if flaschen_id <= tagged else 0,
+                    0,
+                )
+                for flaschen_id in range(1, bottles + 1)
+            ),
+        )
+        conn.executemany(
+            "INSERT INTO Fill_Level (Dispenser_ID, Fill_Level, Time) VALUES (?, ?, ?)",
+            (
+                (dispenser_id, rng.randint(0, 100), str(start + datetime.timedelta(seconds=20 * step)))
+                for step in range(max(1, bottles // 10))
+                for dispenser_id in range(1, DISPENSER_COUNT + 1)
+            ),
+        )
+        # Getaggte Flaschen haben eine Karten-UID, im Benchmark die Flaschen_ID als 4 Byte
+        conn.executemany(
+            "INSERT INTO Flasche_UID (UID, Flaschen_ID) VALUES (?, ?)",
+            ((bottle_uid(flaschen_id).hex(), flaschen_id) for flaschen_id in range(1, tagged + 1)),
+        )
+        conn.commit()
+    finally:
+        conn.close()
+    return path
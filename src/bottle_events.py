@@ -0,0 +1,124 @@
+"""
+Lokaler Event-Kanal "Flasche getaggt" zwischen den Stationen.
+
+Station 1 veröffentlicht nach dem Taggen (State3) ein kleines JSON-Event mit
+Flaschen-ID und Rezept. Station 2 und 3 lauschen auf einem Unix-Datagram-
+Socket und laden die Daten der Flaschen, die gleich bei ihnen ankommen, schon
+vorab in einen PrefetchCache. Am Reader muss dann nur noch die ID bestätigt
+werden.
+
+Das Senden ist "fire and forget": läuft ein Abonnent nicht, geht das Event
+verloren und die Station fragt die Datenbank wie bisher selbst ab. Lauscht
+schon ein Prozess auf dem Socket einer Station (z.B. der Line-Controller und
+eine einzeln gestartete Station 2), behält er den Kanal; der zweite
+Abonnent bleibt ohne Prefetch.
+"""
+import json
+import logging
+import os
+import socket
+import threading
+from collections import OrderedDict
+
+SOCKET_TEMPLATE = "/tmp/mafa_events_{station}.sock"
+SUBSCRIBERS = ('station2', 'station3')
+CACHE_SIZE = 256
+
+logger = logging.getLogger(__name__)
+
+_publish_socket = None
+_publish_lock = threading.Lock()
+
+
+def socket_path(station):
+    return SOCKET_TEMPLATE.format(station=station)
+
+
+def listening(path):
+    """True if a live subscriber is bound to path (not just a stale socket file)."""
+    if not os.path.exists(path):
+        return False
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as probe:
+            probe.connect(path)
+    except OSError:
+        return False
+    return True
+
+
+def publish(event, subscribers=SUBSCRIBERS):
+    """Send event (a JSON-serializable dict) to every running subscriber; never raises."""
+    global _publish_socket
+    payload = json.dumps(event).encode('utf-8')
+    with _publish_lock:
+        if _publish_socket is None:
+            _publish_socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            _publish_socket.setblocking(False)
+        for station in subscribers:
+            try:
+                _publish_socket.sendto(payload, socket_path(station))
+            except (FileNotFoundError, ConnectionRefusedError, BlockingIOError):
+                pass  # Station läuft nicht oder ist überlastet – sie liest dann selbst aus der DB
+            except OSError as e:
+                logger.warning(f"Could not publish event to {station}: {e}")
+
+
+class PrefetchCache:
+    """Thread-safe, size-bounded map Flaschen_ID -> vorab geladene Daten."""
+
+    def __init__(self, size=CACHE_SIZE):
+        self.size = size
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def put(self, flaschen_id, value):
+        with self._lock:
+            self._entries[flaschen_id] = value
+            self._entries.move_to_end(flaschen_id)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def pop(self, flaschen_id):
+        with self._lock:
+            return self._entries.pop(flaschen_id, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class Subscriber(threading.Thread):
+    """Receives events for one station and hands each one to handler(event)."""
+
+    def __init__(self, station, handler, stop_event=None, path=None):
+        super().__init__(name=f"{station}-events", daemon=True)
+        self.handler = handler
+        self.stop_event = stop_event or threading.Event()
+        self.path = path or socket_path(station)
+        self._socket = None
+        if listening(self.path):
+            logger.warning(f"Event socket {self.path} is already in use by another process, "
+                           f"{station} runs without prefetch")
+            return
+        if os.path.exists(self.path):
+            os.remove(self.path)  # Überrest eines beendeten Prozesses
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._socket.bind(self.path)
+        self._socket.settimeout(0.5)
+
+    def run(self):
+        if self._socket is None:
+            return
+        try:
+            while not self.stop_event.is_set():
+                try:
+                    payload = self._socket.recv(4096)
+                except socket.timeout:
+                    continue
+                try:
+                    self.handler(json.loads(payload))
+                except Exception as e:
+                    logger.warning(f"Could not prefetch for event {payload!r}: {e}")
+        finally:
+            self._socket.close()
+            if os.path.exists(self.path):
+                os.remove(self.path)
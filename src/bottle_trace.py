@@ -0,0 +1,206 @@
+"""
+Rückverfolgung einer Flasche: komplette Historie mit einer Abfrage.
+
+Liefert Rezept, Granulatliste, Tagged_Date, Fehler-Flag, Pfad der QR-Datei
+und die bekannten Zeitstempel je Station als JSON. Die Datenbank wird nur
+lesend geöffnet (database.Database read_only), die Abfragen laufen über
+Primärschlüssel bzw. Index und halten keine Sperren, die die Stationen
+brauchen. Ergebnisse werden kurz im Speicher gecacht.
+
+    python bottle_trace.py 27                 # Flaschen_ID
+    python bottle_trace.py uid:04a1b2c3       # Karten-UID (hex)
+    python bottle_trace.py --serve --port 8765
+        GET /trace/27   bzw.   GET /trace/uid:04a1b2c3
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import database
+
+CACHE_SIZE = 1024
+CACHE_TTL = 30.0  # Sekunden; getaggte Flaschen ändern sich danach kaum noch
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+QR_DIR = os.environ.get('MAFA_QR_DIR', os.path.join(BASE_DIR, 'QR_CODES'))
+QR_EXTENSIONS = ('.png', '.svg', '.bin')
+
+TRACE_QUERY = """
+SELECT f.Flaschen_ID, f.Rezept_ID, f.Tagged_Date, f.has_error, r.Stueckzahl,
+       (SELECT json_group_array(json_array(g.Granulat_ID, g.Menge))
+        FROM Rezept_besteht_aus_Granulat g
+        WHERE g.Rezept_ID = f.Rezept_ID)
+FROM Flasche f
+LEFT JOIN Rezept r ON r.Rezept_ID = f.Rezept_ID
+WHERE f.Flaschen_ID = ?;
+"""
+
+
+class TraceError(Exception):
+    pass
+
+
+class InvalidKeyError(TraceError):
+    """The lookup key is malformed (not a Flaschen_ID or uid:<hex>)."""
+
+
+class TraceCache:
+    """Size-bounded LRU cache whose entries expire after ttl seconds."""
+
+    def __init__(self, size=CACHE_SIZE, ttl=CACHE_TTL):
+        self.size = size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                self._entries.pop(key, None)
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+
+class BottleTrace:
+    def __init__(self, db=None, qr_dir=QR_DIR, cache=None):
+        self.db = db or database.Database(read_only=True)
+        self.qr_dir = qr_dir
+        self.cache = cache or TraceCache()
+
+    def resolve(self, key):
+        """Flaschen_ID for a lookup key: a bottle number or 'uid:<hex>'."""
+        key = str(key).strip().lower()
+        if key.startswith('uid:'):
+            try:
+                if not bytes.fromhex(key[4:]):
+                    raise ValueError
+            except ValueError:
+                raise InvalidKeyError(f"Invalid card UID {key[4:]!r}, expected hex digits")
+            try:
+                row = self.db.fetchone("SELECT Flaschen_ID FROM Flasche_UID WHERE UID = ?", (key[4:],))
+            except Exception as e:
+                raise TraceError(f"Card UIDs are not recorded in this database ({e})")
+            if row is None:
+                raise TraceError(f"Unknown card UID {key[4:]}")
+            return row[0]
+        try:
+            flaschen_id = int(key)
+        except ValueError:
+            raise InvalidKeyError(f"Invalid lookup key {key!r}, expected a Flaschen_ID or uid:<hex>")
+        if not -2 ** 63 <= flaschen_id < 2 ** 63:  # außerhalb von SQLite INTEGER
+            raise InvalidKeyError(f"Flaschen_ID {flaschen_id} out of range")
+        return flaschen_id
+
+    def qr_path(self, flaschen_id):
+        for extension in QR_EXTENSIONS:
+            path = os.path.join(self.qr_dir, f"qrcode_{flaschen_id}{extension}")
+            if os.path.exists(path):
+                return path
+        return None
+
+    def lookup(self, key):
+        flaschen_id = self.resolve(key)
+        cached = self.cache.get(flaschen_id)
+        if cached is not None:
+            return cached
+
+        row = self.db.fetchone(TRACE_QUERY, (flaschen_id,))
+        if row is None:
+            raise TraceError(f"Flaschen_ID {flaschen_id} not found")
+        flaschen_id, rezept_id, tagged_date, has_error, stueckzahl, granulate = row
+        tagged_date = tagged_date or None  # ungetaggte Flaschen haben Tagged_Date = 0
+
+        result = {
+            'flaschen_id': flaschen_id,
+            'rezept_id': rezept_id,
+            'rezept_stueckzahl': stueckzahl,
+            'granulate': [{'granulat_id': g, 'menge': m} for g, m in json.loads(granulate or '[]')],
+            'tagged_date': tagged_date,
+            'has_error': bool(has_error),
+            'qr_path': self.qr_path(flaschen_id),
+            'stations': {'station1': {'tagged': tagged_date}},
+        }
+        self.cache.put(flaschen_id, result)
+        return result
+
+
+def make_server(tracer, host='127.0.0.1', port=8765):
+    """HTTP server answering GET /trace/<key> with JSON (400 malformed key, 404 unknown, 500 other errors)."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from urllib.parse import unquote, urlsplit
+
+    class TraceHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            prefix = '/trace/'
+            path = unquote(urlsplit(self.path).path)
+            if not path.startswith(prefix):
+                return self._reply(404, {'error': 'use /trace/<flaschen_id|uid:hex>'})
+            try:
+                self._reply(200, tracer.lookup(path[len(prefix):]))
+            except InvalidKeyError as e:
+                self._reply(400, {'error': str(e)})
+            except TraceError as e:
+                self._reply(404, {'error': str(e)})
+            except Exception as e:
+                # z.B. Datenbank nicht lesbar: trotzdem JSON statt abgebrochener Verbindung
+                self._reply(500, {'error': f"{type(e).__name__}: {e}"})
+
+        def _reply(self, status, body):
+            data = json.dumps(body).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    return ThreadingHTTPServer((host, port), TraceHandler)
+
+
+def serve(tracer, host='127.0.0.1', port=8765):
+    with make_server(tracer, host, port) as server:
+        print(f"Trace service on http://{host}:{port}/trace/<flaschen_id|uid:hex>")
+        server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Look up the full history of a bottle.")
+    parser.add_argument('keys', nargs='*', help='Flaschen_ID or uid:<hex>')
+    parser.add_argument('--db', default=database.DB_PATH)
+    parser.add_argument('--serve', action='store_true', help='Run a local read-only JSON service')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args(argv)
+
+    tracer = BottleTrace(database.Database(args.db, read_only=True))
+    if args.serve:
+        serve(tracer, args.host, args.port)
+        return 0
+
+    status = 0
+    for key in args.keys:
+        try:
+            print(json.dumps(tracer.lookup(key), indent=2))
+        except TraceError as e:
+            print(json.dumps({'key': key, 'error': str(e)}), file=sys.stderr)
+            status = 1
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,228 @@
+"""
+Gemeinsamer Datenbankzugriff der Stationen.
+
+Eine Database-Instanz hält genau eine SQLite-Verbindung, die von mehreren
+Threads (z.B. allen Stationen im Line-Controller main.py) geteilt wird.
+Zugriffe werden über ein Lock serialisiert, Schreibzugriffe sofort committet.
+Mit enable_journal() laufen Schreibzugriffe über submit() stattdessen durch
+ein Write-Behind-Journal (db_journal.py) und werden gebündelt committet.
+Mit writer=<Socket> gehen alle Schreibzugriffe an den Schreib-Daemon
+(db_writer.py), der als einziger Prozess schreibt; die eigene Verbindung wird
+dann nur zum Lesen gebraucht. Ist zusätzlich das Journal aktiv, landet
+submit() zuerst dort und der Flusher wendet die Einträge synchron (mit
+Bestätigung) über den Daemon an – ein nicht erreichbarer Daemon verzögert
+dann nur das Anwenden.
+
+Stationen, die nur nachschlagen (Station 2 und 3), öffnen die Datenbank mit
+read_only=True: URI mode=ro, PRAGMA query_only, Shared Cache und Seitenzugriff
+per Memory-Mapping. Schreibende Verbindungen schalten die Datenbank in den
+WAL-Modus, damit der Schreiber die Leser nicht blockiert, und legen die in
+SCHEMA aufgeführten Indizes/Tabellen an, falls sie noch fehlen.
+"""
+import atexit
+import logging
+import os
+import threading
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DB_PATH = os.path.join(BASE_DIR, '..', 'data', 'flaschen_database.db')
+MMAP_SIZE = 64 * 1024 * 1024  # größer als die Datenbank, damit alle Seiten gemappt werden
+# Write-Behind-Journal neben der Datenbank: <db>.writebehind, für Station 1, main.py und station_daemon.py
+JOURNAL_SUFFIX = '.writebehind'
+LEGACY_JOURNAL_SUFFIXES = ('.station1.writebehind',)  # ältere Station-1-Journale werden übernommen
+
+# Ergänzungen zum ursprünglichen Schema, idempotent beim Öffnen einer schreibenden Verbindung
+SCHEMA = [
+    "CREATE INDEX IF NOT EXISTS idx_granulat_rezept ON Rezept_besteht_aus_Granulat (Rezept_ID)",
+    # Karten-UID -> Flasche, von Station 1 beim Taggen geschrieben (UID als Hex-String)
+    """CREATE TABLE IF NOT EXISTS Flasche_UID (
+        UID TEXT PRIMARY KEY,
+        Flaschen_ID INTEGER NOT NULL,
+        FOREIGN KEY (Flaschen_ID) REFERENCES Flasche (Flaschen_ID)
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_flasche_uid_flasche ON Flasche_UID (Flaschen_ID)",
+    # Wasserzeichen der inkrementellen Exporte (export_history.py)
+    "CREATE INDEX IF NOT EXISTS idx_flasche_tagged ON Flasche (Tagged_Date, Flaschen_ID)",
+    "CREATE INDEX IF NOT EXISTS idx_fill_level_time ON Fill_Level (Time, Dispenser_ID)",
+    # Ein Eintrag je durchlaufenem State und je Flaschen-Zyklus (production_ledger.py)
+    """CREATE TABLE IF NOT EXISTS Production_Event (
+        Event_ID INTEGER PRIMARY KEY,
+        Flaschen_ID INTEGER,
+        Station TEXT NOT NULL,
+        State TEXT NOT NULL,
+        Start_Time TEXT NOT NULL,
+        End_Time TEXT NOT NULL,
+        Outcome TEXT
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_event_flasche ON Production_Event (Flaschen_ID)",
+    "CREATE INDEX IF NOT EXISTS idx_event_time ON Production_Event (Start_Time, Station)",
+    # Zuletzt angewendete Sequenznummer je Write-Behind-Journal (db_journal.py)
+    """CREATE TABLE IF NOT EXISTS Journal_State (
+        Journal TEXT PRIMARY KEY,
+        Applied_Seq INTEGER NOT NULL
+    )""",
+    # Höchste angewendete Anfrage-ID je Client des Schreib-Daemons (db_writer.py)
+    """CREATE TABLE IF NOT EXISTS Writer_Client (
+        Client TEXT PRIMARY KEY,
+        Applied_ID INTEGER NOT NULL,
+        Updated TEXT NOT NULL
+    )""",
+]
+
+
+def uid_hex(uid):
+    """Card UID as returned by read_passive_target -> key used in Flasche_UID."""
+    return bytes(uid).hex()
+
+
+class Database:
+    def __init__(self, path=DB_PATH, logger=None, read_only=False, writer=None):
+        self.path = path
+        self.read_only = read_only
+        self.logger = logger or logging.getLogger(__name__)
+        self._lock = threading.RLock()
+        self._conn = None
+        self.journal = None
+        self.writer = None
+        if writer is not None:
+            import db_writer
+
+            self.writer = db_writer.WriterClient(path, writer, logger=self.logger)
+
+    @property
+    def writable(self):
+        return not self.read_only or self.writer is not None
+
+    def connection(self):
+        if self._conn is None:
+            import sqlite3  # erst bei der ersten Abfrage laden, beschleunigt den Start
+            if self.read_only:
+                from urllib.parse import quote
+                uri = f"file:{quote(os.path.abspath(self.path))}?mode=ro&cache=shared"
+                conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+                conn.execute("PRAGMA query_only = ON")
+            else:
+                conn = sqlite3.connect(self.path, check_same_thread=False)
+                conn.execute("PRAGMA journal_mode = WAL")
+                self._ensure_schema(conn)
+            conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+            self._conn = conn
+        return self._conn
+
+    @staticmethod
+    def _ensure_schema(conn):
+        for statement in SCHEMA:
+            conn.execute(statement)
+        conn.commit()
+
+    def fetchone(self, query, params=()):
+        with self._lock:
+            return self.connection().execute(query, params).fetchone()
+
+    def fetchall(self, query, params=()):
+        with self._lock:
+            return self.connection().execute(query, params).fetchall()
+
+    def iter_chunks(self, query, params=(), size=1000):
+        """Yield the result in lists of at most size rows; the cursor steps lazily, memory stays bounded."""
+        with self._lock:
+            cursor = self.connection().execute(query, params)
+        while True:
+            with self._lock:
+                rows = cursor.fetchmany(size)
+            if not rows:
+                break
+            yield rows
+
+    def execute(self, query, params=()):
+        """Run a single write statement and commit it; returns the number of changed rows."""
+        if self.writer is not None:
+            return self.writer.execute(query, params)
+        with self._lock:
+            conn = self.connection()
+            try:
+                cursor = conn.execute(query, params)
+                conn.commit()
+                return cursor.rowcount
+            except Exception:
+                conn.rollback()
+                raise
+
+    def executemany(self, query, rows):
+        """Run one write statement for many parameter rows in a single transaction."""
+        if self.writer is not None:
+            return self.writer.executemany(query, rows)
+        with self._lock:
+            conn = self.connection()
+            try:
+                conn.executemany(query, rows)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+    def execute_batch(self, statements):
+        """Run several (query, params) write statements in a single transaction."""
+        if self.writer is not None:
+            return self.writer.execute_batch(statements)
+        return self.execute_groups([statements])[0]
+
+    def execute_groups(self, groups):
+        """Run several lists of (query, params) statements in one transaction; returns changed rows per list."""
+        with self._lock:
+            conn = self.connection()
+            try:
+                rowcounts = []
+                for statements in groups:
+                    rowcount = 0
+                    for query, params in statements:
+                        rowcount += max(conn.execute(query, params).rowcount, 0)
+                    rowcounts.append(rowcount)
+                conn.commit()
+                return rowcounts
+            except Exception:
+                conn.rollback()
+                raise
+
+    def submit(self, query, params=()):
+        """Write statement that may be applied later: journaled if enabled, else via the writer daemon or now."""
+        if self.journal is not None:
+            # Journal zuerst: lokal durch fsync gesichert, der Flusher wendet es dann (ggf. über den Daemon) an
+            self.journal.append(query, params)
+        elif self.writer is not None:
+            self.writer.submit(query, params)
+        else:
+            self.execute(query, params)
+
+    def submit_many(self, statements):
+        """Like submit() for several (query, params) statements that must be applied together."""
+        if self.journal is not None:
+            self.journal.append_many(statements)
+        elif self.writer is not None:
+            self.writer.submit_many(statements)
+        else:
+            self.execute_batch(statements)
+
+    def enable_journal(self, path=None, **options):
+        """Route submit() through a write-behind journal; pending entries are replayed in the background."""
+        import db_journal
+
+        if self.journal is None:
+            if path is None:
+                path = self.path + JOURNAL_SUFFIX
+                for suffix in LEGACY_JOURNAL_SUFFIXES:
+                    db_journal.migrate(self, self.path + suffix, path, logger=self.logger)
+            self.journal = db_journal.WriteBehindJournal(self, path, logger=self.logger, **options)
+            self.journal.start()
+            atexit.register(self.journal.stop)
+        return self.journal
+
+    def close(self):
+        if self.journal is not None:
+            self.journal.stop()
+        if self.writer is not None:
+            self.writer.close()
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,181 @@
+"""
+Write-behind journal for station database mutations.
+
+Stations append each mutation (one or more SQL statements with parameters
+that belong together) to a local append-only file and continue immediately;
+a single fsync on a small file is much cheaper on the SD card than a full
+SQLite commit. A background flusher applies the
+pending mutations to SQLite in grouped transactions.
+
+Every entry carries a sequence number. The highest applied number is stored
+in the table Journal_State (see database.SCHEMA) inside the same transaction as the mutations, so
+replaying the journal after a crash or restart applies each entry exactly
+once. Lock errors only delay the flush, the bottle itself is not failed.
+Entries left over from the last run are replayed by the flusher thread as
+well, so a locked database does not block the station's start.
+"""
+import json
+import logging
+import os
+import threading
+
+FLUSH_INTERVAL = 0.5  # Sekunden
+MAX_BATCH = 500
+MAX_BACKOFF = 5.0
+
+def applied_seq(db, path):
+    row = db.fetchone("SELECT Applied_Seq FROM Journal_State WHERE Journal = ?", (os.path.basename(path),))
+    return row[0] if row else 0
+
+
+def migrate(db, old_path, path, logger=None):
+    """
+    Move the pending entries of a journal file that is no longer used into path.
+
+    Entries are renumbered after the highest sequence already applied for
+    path, so they are applied exactly once under the new name. Does nothing
+    if old_path does not exist or path already exists.
+    """
+    if not os.path.exists(old_path) or os.path.exists(path):
+        return 0
+    logger = logger or logging.getLogger(__name__)
+    old = WriteBehindJournal(db, old_path, logger=logger)
+    old._file.close()
+    first_seq = applied_seq(db, path) + 1
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        for seq, entry in enumerate(old.pending, first_seq):
+            f.write(json.dumps({'seq': seq, 'statements': entry['statements']}) + '\n')
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    os.remove(old_path)
+    logger.info(f"Moved {len(old.pending)} pending journal entries from {old_path} to {path}")
+    return len(old.pending)
+
+
+class WriteBehindJournal:
+    def __init__(self, db, path, flush_interval=FLUSH_INTERVAL, max_batch=MAX_BATCH, logger=None):
+        self.db = db
+        self.path = path
+        self.name = os.path.basename(path)
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.logger = logger or logging.getLogger(__name__)
+
+        self._lock = threading.Lock()         # schützt Datei, Sequenz und pending
+        self._flush_lock = threading.Lock()   # nur ein Flush gleichzeitig
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+        # Journal_State legt jede schreibende Verbindung an (database.SCHEMA), auch die des Schreib-Daemons
+        self.applied_seq = applied_seq(self.db, self.path)
+        self.pending = [entry for entry in self._read_entries() if entry['seq'] > self.applied_seq]
+        self.seq = max([self.applied_seq] + [entry['seq'] for entry in self.pending])
+        self._file = open(self.path, 'a', encoding='utf-8')
+
+    def _read_entries(self):
+        if not os.path.exists(self.path):
+            return []
+        entries = []
+        valid_end = 0
+        with open(self.path, 'rb') as f:
+            for line in f:
+                try:
+                    if not line.endswith(b'\n'):
+                        raise ValueError
+                    entries.append(json.loads(line))
+                    valid_end = f.tell()
+                except ValueError:
+                    # Abgebrochene letzte Zeile (Stromausfall während append) – wurde nie bestätigt
+                    self.logger.warning(f"Ignoring torn journal line in {self.path}")
+        if valid_end < os.path.getsize(self.path):
+            # Rest abschneiden, sonst hinge der nächste Eintrag an dem Fragment und wäre selbst unlesbar
+            with open(self.path, 'r+b') as f:
+                f.truncate(valid_end)
+                f.flush()
+                os.fsync(f.fileno())
+        return entries
+
+    def append(self, query, params=()):
+        """Durably record a mutation; it is applied to SQLite by the flusher."""
+        return self.append_many([(query, params)])
+
+    def append_many(self, statements):
+        """Durably record several (query, params) statements that are always applied together."""
+        with self._lock:
+            self.seq += 1
+            entry = {'seq': self.seq, 'statements': [[query, list(params)] for query, params in statements]}
+            self._file.write(json.dumps(entry) + '\n')
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self.pending.append(entry)
+            if len(self.pending) >= self.max_batch:
+                self._wakeup.set()
+        return entry['seq']
+
+    def pending_statements(self):
+        """(query, params) of all entries not applied to SQLite yet, in journal order."""
+        with self._lock:
+            return [(query, tuple(params)) for entry in self.pending for query, params in entry['statements']]
+
+    def flush(self):
+        """Apply all pending mutations in grouped transactions; returns the number applied."""
+        applied = 0
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    batch = self.pending[:self.max_batch]
+                if not batch:
+                    break
+                last_seq = batch[-1]['seq']
+                statements = [tuple(statement) for entry in batch for statement in entry['statements']]
+                statements.append((
+                    "INSERT OR REPLACE INTO Journal_State (Journal, Applied_Seq) VALUES (?, ?)",
+                    (self.name, last_seq),
+                ))
+                self.db.execute_batch(statements)
+                with self._lock:
+                    del self.pending[:len(batch)]
+                    self.applied_seq = last_seq
+                    if not self.pending:
+                        # Alles angewendet: Journal leeren, damit es nicht endlos wächst
+                        self._file.truncate(0)
+                applied += len(batch)
+        return applied
+
+    def _run(self):
+        backoff = self.flush_interval
+        while not self._stopped.is_set():
+            self._wakeup.wait(backoff)
+            self._wakeup.clear()
+            try:
+                self.flush()
+                backoff = self.flush_interval
+            except Exception as e:
+                # z.B. "database is locked": Einträge bleiben im Journal und werden später angewendet
+                backoff = min(MAX_BACKOFF, backoff * 2)
+                self.logger.warning(f"Journal flush failed, retrying in {backoff:.1f}s: {e}")
+
+    def start(self):
+        if self.pending:
+            # Nicht hier anwenden: bei gesperrter Datenbank würde der Start der Station scheitern
+            self.logger.info(f"Replaying {len(self.pending)} journal entries from {self.path} in the background")
+            self._wakeup.set()
+        self._thread = threading.Thread(target=self._run, name='journal-flusher', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the flusher and apply what is left; entries that still fail stay in the journal."""
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        try:
+            self.flush()
+        except Exception as e:
+            self.logger.error(f"Final journal flush failed, {len(self.pending)} entries kept in {self.path}: {e}")
+        if not self._file.closed:
+            self._file.close()
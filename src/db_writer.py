@@ -0,0 +1,356 @@
+"""
+Lokaler Schreib-Daemon: einzige schreibende Verbindung für alle Stationsprozesse.
+
+Laufen die Stationen als getrennte Prozesse, schreibt sonst jede über eine
+eigene Verbindung und es kommt unter Last zu "database is locked". Der Daemon
+besitzt die einzige schreibende Verbindung, nimmt Änderungen über einen
+Unix-Socket entgegen und wendet alles, was während eines Commits auflief, in
+der nächsten gemeinsamen Transaktion an (Group Commit). Jede Anfrage wird nach
+dem Commit bestätigt.
+
+Die Stationen nutzen den Daemon über database.Database(writer=...), siehe
+running(). submit()/submit_many() warten nicht auf die Bestätigung,
+execute()/execute_batch()/executemany() schon. Bricht die Verbindung ab,
+werden unbestätigte submit()-Anfragen nach dem Neuaufbau erneut gesendet.
+Wartende Aufrufe scheitern dagegen sofort mit AckLostError (ebenso nach
+ACK_TIMEOUT): die Änderung ist vielleicht angewendet und wird nicht erneut
+gesendet, der Aufrufer entscheidet, ob er sie wiederholt. Jeder Client
+meldet sich mit einer eigenen ID an; die höchste angewendete Anfrage-ID je
+Client steht in Writer_Client (Commit in derselben Transaktion), sodass eine
+erneut gesendete, bereits angewendete Anfrage nicht doppelt ausgeführt wird.
+
+Protokoll: eine JSON-Zeile je Nachricht.
+    -> {"id": 1, "statements": [[sql, params], ...]}
+    <- {"id": 1, "ok": true, "rowcount": 1}   bzw.   {"id": 1, "ok": false, "error": "..."}
+    -> {"id": 0, "hello": "/pfad/zur/datenbank.db", "client": "<uuid>"}
+    <- {"id": 0, "ok": true, "db": "/pfad/zur/datenbank.db"}
+
+    python db_writer.py serve [--db ../data/flaschen_database.db]
+    python db_writer.py ping
+"""
+import argparse
+import json
+import logging
+import os
+import socket
+import sys
+import threading
+import uuid
+
+SOCKET_PATH = os.environ.get('MAFA_DB_WRITER', '/tmp/mafa_db_writer.sock')
+ACK_TIMEOUT = 10.0  # Sekunden, für execute()/execute_batch()
+MAX_BATCH = 500  # Anfragen je Transaktion
+CONNECT_TIMEOUT = 1.0
+
+
+class WriterError(Exception):
+    pass
+
+
+class AckLostError(WriterError):
+    """Sent, but the acknowledgement never arrived: the mutation may or may not have been applied."""
+
+
+def _same_db(a, b):
+    return os.path.realpath(a) == os.path.realpath(b)
+
+
+def running(db_path, socket_path=SOCKET_PATH):
+    """Socket path if a writer daemon for db_path is running, else None."""
+    if not os.path.exists(socket_path):
+        return None
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(CONNECT_TIMEOUT)
+            sock.connect(socket_path)
+            sock.sendall(json.dumps({'id': 0, 'hello': os.path.abspath(db_path)}).encode('utf-8') + b'\n')
+            reply = json.loads(sock.makefile('rb').readline() or b'{}')
+    except (OSError, ValueError):
+        return None
+    return socket_path if reply.get('ok') and _same_db(reply.get('db', ''), db_path) else None
+
+
+class WriterClient:
+    """Connection of one process to the writer daemon; thread-safe."""
+
+    def __init__(self, db_path, socket_path=SOCKET_PATH, logger=None, ack_timeout=ACK_TIMEOUT):
+        self.db_path = db_path
+        self.socket_path = socket_path
+        self.logger = logger or logging.getLogger(__name__)
+        self.ack_timeout = ack_timeout
+        self._lock = threading.Lock()
+        self._sock = None
+        self.client_id = uuid.uuid4().hex  # Anfrage-IDs sind nur je Client eindeutig
+        self._next_id = 1
+        self._pending = {}  # id -> [statements, Event, Antwort]
+        self._idle = threading.Condition(self._lock)
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(CONNECT_TIMEOUT)
+        sock.connect(self.socket_path)
+        reader = sock.makefile('rb')
+        hello = {'id': 0, 'hello': os.path.abspath(self.db_path), 'client': self.client_id}
+        sock.sendall(json.dumps(hello).encode('utf-8') + b'\n')
+        reply = json.loads(reader.readline() or b'{}')
+        if not reply.get('ok') or not _same_db(reply.get('db', ''), self.db_path):
+            sock.close()
+            raise WriterError(f"Writer daemon on {self.socket_path} serves {reply.get('db')}, not {self.db_path}")
+        sock.settimeout(None)
+        self._sock = sock
+        # Nach einem Verbindungsabbruch unbestätigte Anfragen in Reihenfolge erneut senden
+        for request_id in sorted(self._pending):
+            self._write(request_id, self._pending[request_id][0])
+        threading.Thread(target=self._read_acks, args=(sock, reader), name='db-writer-acks', daemon=True).start()
+
+    def _write(self, request_id, statements):
+        message = {'id': request_id, 'statements': [[query, list(params)] for query, params in statements]}
+        self._sock.sendall(json.dumps(message).encode('utf-8') + b'\n')
+
+    def _read_acks(self, sock, reader):
+        try:
+            for line in reader:
+                self._acknowledge(json.loads(line))
+        except (OSError, ValueError):
+            pass
+        with self._lock:
+            if self._sock is sock:
+                self._sock = None
+                self.logger.warning("Connection to writer daemon lost, pending writes are resent on reconnect")
+                # Wartende Aufrufe sofort scheitern lassen statt ACK_TIMEOUT abzuwarten; nicht erneut senden
+                lost = [request_id for request_id, entry in self._pending.items() if entry[1] is not None]
+                for request_id in lost:
+                    entry = self._pending.pop(request_id)
+                    entry[2] = {'id': request_id, 'ok': False, 'lost': True, 'error': 'connection to writer daemon lost'}
+                    entry[1].set()
+                if not self._pending:
+                    self._idle.notify_all()
+        sock.close()
+
+    def _acknowledge(self, reply):
+        with self._lock:
+            entry = self._pending.pop(reply['id'], None)
+            if not self._pending:
+                self._idle.notify_all()
+        if entry is None:
+            return
+        entry[2] = reply
+        if entry[1] is not None:
+            entry[1].set()
+        elif not reply['ok']:
+            self.logger.error(f"Writer daemon rejected a mutation: {reply.get('error')} ({entry[0]})")
+
+    def _send(self, statements, wait):
+        statements = [(query, tuple(params)) for query, params in statements]
+        with self._lock:
+            request_id = self._next_id
+            self._next_id += 1
+            entry = self._pending[request_id] = [statements, threading.Event() if wait else None, None]
+            try:
+                if self._sock is None:
+                    self._connect()  # sendet auch diese Anfrage
+                else:
+                    self._write(request_id, statements)
+            except (OSError, ValueError, WriterError) as e:
+                if self._sock is not None:
+                    self._sock.close()
+                    self._sock = None
+                if wait or isinstance(e, WriterError):
+                    del self._pending[request_id]
+                    raise WriterError(f"Writer daemon on {self.socket_path} not usable: {e}")
+                # Asynchron: bleibt vorgemerkt und geht mit der nächsten Verbindung raus
+                self.logger.warning(f"Writer daemon not reachable, mutation queued: {e}")
+                return None
+        if not wait:
+            return None
+        if not entry[1].wait(self.ack_timeout):
+            with self._lock:
+                if self._pending.pop(request_id, None) is not None:  # sonst kam die Antwort gerade noch
+                    if not self._pending:
+                        self._idle.notify_all()
+                    raise AckLostError(f"No acknowledgement from writer daemon within {self.ack_timeout}s, "
+                                       f"the mutation may have been applied")
+        reply = entry[2]
+        if reply.get('lost'):
+            raise AckLostError(f"{reply['error']} before the acknowledgement, the mutation may have been applied")
+        if not reply['ok']:
+            raise WriterError(reply.get('error'))
+        return reply.get('rowcount', 0)
+
+    def submit(self, query, params=()):
+        self._send([(query, params)], wait=False)
+
+    def submit_many(self, statements):
+        self._send(statements, wait=False)
+
+    def execute(self, query, params=()):
+        return self._send([(query, params)], wait=True)
+
+    def execute_batch(self, statements):
+        return self._send(statements, wait=True)
+
+    def executemany(self, query, rows):
+        return self._send([(query, row) for row in rows], wait=True)
+
+    def flush(self, timeout=ACK_TIMEOUT):
+        """Wait until every sent mutation is acknowledged; returns False on timeout."""
+        with self._lock:
+            return self._idle.wait_for(lambda: not self._pending, timeout)
+
+    def close(self):
+        if not self.flush():
+            self.logger.error(f"{len(self._pending)} writes not acknowledged by the writer daemon")
+        with self._lock:
+            if self._sock is not None:
+                self._sock.close()
+                self._sock = None
+
+
+class WriterDaemon:
+    def __init__(self, db_path, socket_path=SOCKET_PATH, max_batch=MAX_BATCH, logger=None):
+        import queue
+
+        import database
+
+        self.db = database.Database(db_path, logger=logger)
+        self.socket_path = socket_path
+        self.max_batch = max_batch
+        self.logger = logger or logging.getLogger(__name__)
+        self._queue = queue.Queue()
+        self._stopped = threading.Event()
+        self._applied = {}  # Client -> höchste angewendete Anfrage-ID
+
+    def applied_id(self, client):
+        if client not in self._applied:
+            row = self.db.fetchone("SELECT Applied_ID FROM Writer_Client WHERE Client = ?", (client,))
+            self._applied[client] = row[0] if row else 0
+        return self._applied[client]
+
+    def _apply(self, batch):
+        """Commit a batch of (request, reply) in one transaction; isolate failing requests."""
+        fresh = []
+        for request, reply in batch:
+            # Ein Client sendet in ID-Reihenfolge; kleinere IDs sind erneut gesendete, schon angewendete Anfragen
+            if request['id'] <= self.applied_id(request['client']):
+                reply({'id': request['id'], 'ok': True, 'rowcount': 0, 'duplicate': True})
+            else:
+                fresh.append((request, reply))
+        if not fresh:
+            return
+        batch = fresh
+        last_ids = {}
+        for request, _ in batch:
+            last_ids[request['client']] = max(last_ids.get(request['client'], 0), request['id'])
+        progress = [
+            ("INSERT OR REPLACE INTO Writer_Client (Client, Applied_ID, Updated) VALUES (?, ?, datetime('now'))",
+             (client, request_id))
+            for client, request_id in last_ids.items()
+        ]
+        try:
+            rowcounts = self.db.execute_groups([request['statements'] for request, _ in batch] + [progress])
+        except Exception as e:
+            if len(batch) == 1:
+                request, reply = batch[0]
+                reply({'id': request['id'], 'ok': False, 'error': str(e)})
+                return
+            # Eine fehlerhafte Anfrage darf die übrigen nicht mitreißen: einzeln wiederholen
+            for item in batch:
+                self._apply([item])
+            return
+        self._applied.update(last_ids)
+        for (request, reply), rowcount in zip(batch, rowcounts):
+            reply({'id': request['id'], 'ok': True, 'rowcount': rowcount})
+
+    def _run_writer(self):
+        import queue
+
+        while not self._stopped.is_set():
+            try:
+                batch = [self._queue.get(timeout=0.5)]
+            except queue.Empty:
+                continue
+            # Alles, was während des letzten Commits aufgelaufen ist, kommt in dieselbe Transaktion
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._apply(batch)
+
+    def serve_forever(self):
+        import socketserver
+
+        daemon = self
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+        class WriterHandler(socketserver.StreamRequestHandler):
+            def handle(self):
+                send_lock = threading.Lock()
+
+                def reply(message):
+                    with send_lock:
+                        try:
+                            self.wfile.write(json.dumps(message).encode('utf-8') + b'\n')
+                            self.wfile.flush()
+                        except OSError:
+                            pass  # Client weg; er sendet die Anfrage beim Neuaufbau erneut
+
+                client = None
+                for line in self.rfile:
+                    request = json.loads(line)
+                    if 'hello' in request:
+                        client = request.get('client') or uuid.uuid4().hex
+                        reply({'id': request['id'], 'ok': True, 'db': os.path.abspath(daemon.db.path)})
+                    else:
+                        request['client'] = client
+                        daemon._queue.put((request, reply))
+
+        self.db.connection()  # legt fehlende Tabellen (database.SCHEMA) an, bevor Clients lesen
+        # Einträge längst beendeter Clients (jeder Prozessstart ist ein neuer Client) aufräumen
+        self.db.execute("DELETE FROM Writer_Client WHERE Updated < datetime('now', '-7 days')")
+        writer = threading.Thread(target=self._run_writer, name='db-writer', daemon=True)
+        writer.start()
+        with socketserver.ThreadingUnixStreamServer(self.socket_path, WriterHandler) as server:
+            server.daemon_threads = True
+            self.logger.info(f"Writer daemon for {self.db.path} listening on {self.socket_path}")
+            try:
+                server.serve_forever()
+            finally:
+                self._stopped.set()
+                writer.join()
+                self.db.close()
+                os.remove(self.socket_path)
+
+
+def main(argv=None):
+    import database
+
+    parser = argparse.ArgumentParser(description="Single writer for the station database.")
+    parser.add_argument('command', choices=['serve', 'ping'])
+    parser.add_argument('--db', default=database.DB_PATH)
+    parser.add_argument('--socket', default=SOCKET_PATH)
+    args = parser.parse_args(argv)
+
+    if args.command == 'ping':
+        if running(args.db, args.socket):
+            print(f"Writer daemon for {args.db} is running on {args.socket}")
+            return 0
+        print(f"No writer daemon for {args.db} on {args.socket}")
+        return 1
+
+    import signal
+
+    import log_setup
+
+    log_setup.setup_logging(os.path.join(database.BASE_DIR, 'db_writer.log'))
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))  # sauber beenden: letzter Batch, Socket weg
+    try:
+        WriterDaemon(args.db, args.socket).serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
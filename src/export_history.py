@@ -0,0 +1,256 @@
+"""
+Streaming-Export der Produktionshistorie als CSV oder Parquet.
+
+Exportiert Flasche, Rezept, Rezept_besteht_aus_Granulat und Fill_Level über
+eine eigene Read-only-Verbindung (WAL: die Stationen schreiben währenddessen
+weiter). Die Zeilen werden blockweise vom Cursor geholt und sofort
+geschrieben, der Speicherbedarf hängt nicht von der Tabellengröße ab.
+
+Flasche (nur getaggte Flaschen, nach Tagged_Date) und Fill_Level (nach Time)
+werden inkrementell exportiert: das Wasserzeichen des letzten Laufs steht in
+export_state.json im Zielverzeichnis. Rezepte und Granulate sind klein und werden jedes Mal
+vollständig geschrieben. Jeder Lauf landet in einem eigenen Verzeichnis, das
+erst nach dem Schreiben aller Dateien umbenannt wird; danach wird das
+Wasserzeichen gespeichert. Bricht ein Lauf dazwischen ab, exportiert der
+nächste dieselben Zeilen erneut, es geht keine verloren.
+
+Station 1 setzt Tagged_Date beim Taggen, in SQLite landet die Zeile aber erst
+später (Write-Behind-Journal, Schreib-Daemon, Nachspielen nach einem Absturz).
+Damit eine solche Zeile nicht hinter ein schon gespeichertes Wasserzeichen
+fällt, werden nur Zeilen exportiert, deren Zeitstempel mindestens --lag
+Sekunden (UTC) zurückliegt; jüngere kommen mit dem nächsten Lauf.
+
+    python export_history.py --out ../exports --format csv
+    python export_history.py --format parquet --full     # Wasserzeichen ignorieren
+
+Parquet braucht pyarrow (pip install pyarrow).
+"""
+import argparse
+import csv
+import datetime
+import json
+import os
+import shutil
+import sys
+
+import database
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+EXPORT_DIR = os.path.join(BASE_DIR, '..', 'exports')
+STATE_FILE = 'export_state.json'
+CHUNK_SIZE = 10000
+EXPORT_LAG = 600  # Sekunden; länger als ein Journal/Daemon im Normalfall zum Anwenden braucht
+FORMATS = ('csv', 'parquet')
+
+# Spalten mit Parquet-Typ; watermark = Sortierschlüssel der inkrementellen Exporte
+# (Zeitstempel plus Primärschlüssel, damit gleiche Zeitstempel nicht verloren gehen)
+TABLES = {
+    'Flasche': {
+        'select': "Flaschen_ID, Rezept_ID, Tagged_Date, CAST(has_error AS INTEGER)",
+        'columns': [('Flaschen_ID', 'int64'), ('Rezept_ID', 'int64'), ('Tagged_Date', 'string'), ('has_error', 'bool')],
+        'watermark': ('Tagged_Date', 'Flaschen_ID'),
+    },
+    'Rezept': {
+        'select': "Rezept_ID, Stueckzahl",
+        'columns': [('Rezept_ID', 'int64'), ('Stueckzahl', 'int64')],
+        'order': "Rezept_ID",
+    },
+    'Rezept_besteht_aus_Granulat': {
+        'select': "Rezept_ID, Granulat_ID, Menge",
+        'columns': [('Rezept_ID', 'int64'), ('Granulat_ID', 'int64'), ('Menge', 'float64')],
+        'order': "Rezept_ID, Granulat_ID",
+    },
+    'Fill_Level': {
+        'select': "Dispenser_ID, Fill_Level, Time",
+        'columns': [('Dispenser_ID', 'int64'), ('Fill_Level', 'int64'), ('Time', 'string')],
+        'watermark': ('Time', 'Dispenser_ID'),
+    },
+}
+
+
+class ExportError(Exception):
+    pass
+
+
+def build_query(table, watermark=None, lag=EXPORT_LAG):
+    """SELECT for one table; with a watermark only rows after it (in watermark order) and older than lag."""
+    spec = TABLES[table]
+    query = f"SELECT {spec['select']} FROM {table}"
+    params = ()
+    if 'watermark' in spec:
+        time_column, key_column = spec['watermark']
+        if watermark is not None:
+            # Zeilenwert-Vergleich nutzt den Index (Zeit, Schlüssel)
+            query += f" WHERE ({time_column}, {key_column}) > (?, ?)"
+            params = tuple(watermark)
+        else:
+            # Zeitstempel sind Text und damit größer als jede Zahl: ungetaggte Flaschen (0) und NULL fallen weg
+            query += f" WHERE {time_column} > 0"
+        query += f" AND {time_column} <= datetime('now', ?)"
+        params += (f"-{lag} seconds",)
+        query += f" ORDER BY {time_column}, {key_column}"
+    else:
+        query += f" ORDER BY {spec['order']}"
+    return query, params
+
+
+def watermark_of(table, row):
+    time_column, key_column = TABLES[table]['watermark']
+    names = [name for name, _ in TABLES[table]['columns']]
+    return [row[names.index(time_column)], row[names.index(key_column)]]
+
+
+class CsvWriter:
+    extension = '.csv'
+
+    def __init__(self, path, columns):
+        self._file = open(path, 'w', encoding='utf-8', newline='')
+        self._writer = csv.writer(self._file)
+        self._writer.writerow([name for name, _ in columns])
+
+    def write(self, rows):
+        self._writer.writerows(rows)
+
+    def close(self):
+        self._file.close()
+
+
+# SQLite liefert BOOLEAN als 0/1, Zeitstempel können auch als Zahl gespeichert sein
+PARQUET_CONVERTERS = {'bool': bool, 'string': str}
+
+
+class ParquetWriter:
+    extension = '.parquet'
+
+    def __init__(self, path, columns):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ExportError("Parquet export needs pyarrow (pip install pyarrow)")
+        types = {'int64': pyarrow.int64, 'float64': pyarrow.float64, 'string': pyarrow.string, 'bool': pyarrow.bool_}
+        self._pa = pyarrow
+        self._schema = pyarrow.schema([(name, types[type_name]()) for name, type_name in columns])
+        self._convert = [PARQUET_CONVERTERS.get(type_name) for _, type_name in columns]
+        self._writer = pyarrow.parquet.ParquetWriter(path, self._schema)
+
+    def write(self, rows):
+        # Ein Row-Group je Block, spaltenweise aufgebaut
+        columns = list(zip(*rows))
+        arrays = [
+            self._pa.array(values if convert is None else [None if v is None else convert(v) for v in values],
+                           type=field.type)
+            for values, field, convert in zip(columns, self._schema, self._convert)
+        ]
+        self._writer.write_table(self._pa.Table.from_arrays(arrays, schema=self._schema))
+
+    def close(self):
+        self._writer.close()
+
+
+WRITERS = {'csv': CsvWriter, 'parquet': ParquetWriter}
+
+
+def load_state(out_dir):
+    path = os.path.join(out_dir, STATE_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_state(out_dir, state):
+    path = os.path.join(out_dir, STATE_FILE)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def export_table(db, table, writer_class, directory, watermark=None, chunk_size=CHUNK_SIZE, lag=EXPORT_LAG):
+    """Stream one table into directory; returns (row count, new watermark)."""
+    spec = TABLES[table]
+    query, params = build_query(table, watermark, lag)
+    writer = writer_class(os.path.join(directory, table + writer_class.extension), spec['columns'])
+    count = 0
+    last_row = None
+    try:
+        for rows in db.iter_chunks(query, params, chunk_size):
+            writer.write(rows)
+            count += len(rows)
+            last_row = rows[-1]
+    finally:
+        writer.close()
+    if 'watermark' in spec and last_row is not None:
+        watermark = watermark_of(table, last_row)
+    return count, watermark
+
+
+def export(db, out_dir=EXPORT_DIR, fmt='csv', tables=None, full=False, chunk_size=CHUNK_SIZE, lag=EXPORT_LAG):
+    """
+    Export tables into a new run directory below out_dir.
+
+    Returns the run directory and {table: row count}. Watermarks are only
+    advanced after the run directory is complete.
+    """
+    if fmt not in WRITERS:
+        raise ExportError(f"Unknown export format {fmt!r}, expected one of {', '.join(FORMATS)}")
+    tables = tables or list(TABLES)
+    os.makedirs(out_dir, exist_ok=True)
+    state = load_state(out_dir)
+
+    run = datetime.datetime.now().strftime('%Y%m%dT%H%M%S.%f')
+    run_dir = os.path.join(out_dir, run)
+    suffix = 1
+    while os.path.exists(run_dir) or os.path.exists(os.path.join(out_dir, f".{run}.tmp")):
+        run = f"{run.split('-')[0]}-{suffix}"  # zwei Läufe in derselben Mikrosekunde
+        run_dir = os.path.join(out_dir, run)
+        suffix += 1
+    tmp_dir = os.path.join(out_dir, f".{run}.tmp")
+    os.makedirs(tmp_dir)
+    counts = {}
+    try:
+        for table in tables:
+            counts[table], watermark = export_table(
+                db, table, WRITERS[fmt], tmp_dir, None if full else state.get(table), chunk_size, lag
+            )
+            if watermark is not None:
+                state[table] = watermark
+        os.replace(tmp_dir, run_dir)  # Konsumenten sehen nur vollständige Läufe
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    save_state(out_dir, state)
+    return run_dir, counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stream production history into CSV or Parquet files.")
+    parser.add_argument('--db', default=database.DB_PATH)
+    parser.add_argument('--out', default=EXPORT_DIR, help='Export directory (one subdirectory per run)')
+    parser.add_argument('--format', choices=FORMATS, default='csv')
+    parser.add_argument('--tables', nargs='+', choices=list(TABLES))
+    parser.add_argument('--full', action='store_true', help='Ignore the stored watermarks and export everything')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='Rows fetched and written per step')
+    parser.add_argument('--lag', type=float, default=EXPORT_LAG,
+                        help='Only export rows whose timestamp is at least this many seconds old (UTC)')
+    args = parser.parse_args(argv)
+
+    db = database.Database(args.db, read_only=True)
+    try:
+        run_dir, counts = export(db, args.out, args.format, args.tables, args.full, args.chunk_size, args.lag)
+    except ExportError as e:
+        print(e, file=sys.stderr)
+        return 1
+    finally:
+        db.close()
+    for table, count in counts.items():
+        print(f"{table}: {count} rows")
+    print(f"Export written to {run_dir}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
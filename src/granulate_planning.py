@@ -0,0 +1,220 @@
+"""
+Granulat-Bedarfsplanung gegen die Füllstände der Dispenser.
+
+Rezept_besteht_aus_Granulat kann dasselbe Granulat mehrfach je Rezept
+enthalten (Rezept 3: Granulat 3 mit 42.0 und 18.0); die Mengen werden zu einer
+Bedarfsmatrix Rezept x Granulat aufsummiert. Der Bedarf aller ungetaggten
+Flaschen (bzw. eines angenommenen Auftrags) wird in einem Schritt mit NumPy
+berechnet und mit dem letzten Fill_Level je Dispenser verglichen: wie viele
+Flaschen in Produktionsreihenfolge (Flaschen_ID aufsteigend, wie Station 1
+sie taggt) noch möglich sind und bei welcher Flasche welcher Dispenser leer
+wird.
+
+Annahmen: Dispenser n enthält Granulat n (DISPENSER_GRANULAT), Fill_Level ist
+ein Prozentwert und ein voller Dispenser fasst DISPENSER_CAPACITY
+Mengeneinheiten.
+
+    python granulate_planning.py                       # ungetaggte Flaschen
+    python granulate_planning.py --order 1=1000 3=500  # Was-wäre-wenn-Auftrag
+    python granulate_planning.py --capacity 2500 --cycle-seconds 12 --json
+"""
+import argparse
+import json
+import sys
+
+import numpy as np
+
+import database
+
+DISPENSER_CAPACITY = 1000.0  # Mengeneinheiten bei Fill_Level 100
+DISPENSER_GRANULAT = {1: 1, 2: 2, 3: 3}  # Dispenser_ID -> Granulat_ID
+CHUNK_SIZE = 100000
+
+RECIPE_QUERY = "SELECT Rezept_ID, Granulat_ID, Menge FROM Rezept_besteht_aus_Granulat"
+UNTAGGED_QUERY = "SELECT Flaschen_ID, Rezept_ID FROM Flasche WHERE Tagged_Date IS 0 ORDER BY Flaschen_ID"
+# Letzter Stand je Dispenser über den Primärschlüssel (Dispenser_ID, Time)
+FILL_LEVEL_QUERY = """
+SELECT f.Dispenser_ID, f.Fill_Level, f.Time
+FROM Fill_Level f
+WHERE f.Time = (SELECT MAX(Time) FROM Fill_Level WHERE Dispenser_ID = f.Dispenser_ID)
+ORDER BY f.Dispenser_ID
+"""
+CYCLE_QUERY = "SELECT AVG((julianday(End_Time) - julianday(Start_Time)) * 86400.0) FROM Production_Event " \
+              "WHERE Station = 'station1' AND State = 'cycle' AND Outcome = 'State4'"
+
+
+class RecipeMatrix:
+    """Demand per bottle: matrix[recipe index, granulate index], duplicate rows summed."""
+
+    def __init__(self, rows):
+        data = np.array(rows, dtype=np.float64).reshape(-1, 3)
+        self.recipe_ids, recipe_index = np.unique(data[:, 0].astype(np.int64), return_inverse=True)
+        self.granulat_ids, granulat_index = np.unique(data[:, 1].astype(np.int64), return_inverse=True)
+        self.matrix = np.zeros((len(self.recipe_ids), len(self.granulat_ids)))
+        np.add.at(self.matrix, (recipe_index, granulat_index), data[:, 2])
+
+    def demand(self, bottle_recipes):
+        """Per-bottle demand (bottles x granulates); unknown recipes need nothing and are counted."""
+        if not len(self.recipe_ids):
+            return np.zeros((len(bottle_recipes), len(self.granulat_ids))), len(bottle_recipes)  # keine Rezepte
+        index = np.searchsorted(self.recipe_ids, bottle_recipes)
+        index = np.minimum(index, len(self.recipe_ids) - 1)
+        known = self.recipe_ids[index] == bottle_recipes
+        demand = self.matrix[index]
+        demand[~known] = 0.0
+        return demand, int((~known).sum())
+
+
+def load_untagged(db, chunk_size=CHUNK_SIZE):
+    """Flaschen_ID and Rezept_ID of all untagged bottles in production order, as int64 arrays."""
+    chunks = [np.array(rows, dtype=np.int64) for rows in db.iter_chunks(UNTAGGED_QUERY, size=chunk_size)]
+    if not chunks:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    bottles = np.concatenate(chunks)
+    return bottles[:, 0], bottles[:, 1]
+
+
+def order_bottles(order):
+    """What-if order {Rezept_ID: count} -> (positions 1..n in the order, Rezept_IDs)."""
+    recipes = np.repeat(np.array(list(order), dtype=np.int64), np.array(list(order.values()), dtype=np.int64))
+    return np.arange(1, len(recipes) + 1, dtype=np.int64), recipes
+
+
+def load_fill_levels(db):
+    return db.fetchall(FILL_LEVEL_QUERY)
+
+
+def mean_cycle_seconds(db):
+    """Mean successful station1 cycle from Production_Event, None if nothing was recorded."""
+    try:
+        row = db.fetchone(CYCLE_QUERY)
+    except Exception:
+        return None  # Datenbank ohne Production_Event
+    return row[0] if row else None
+
+
+def plan(recipes, bottle_ids, bottle_recipes, fill_levels, capacity=DISPENSER_CAPACITY,
+         dispenser_granulat=DISPENSER_GRANULAT, cycle_seconds=None, id_name='flaschen_id'):
+    """
+    Compare the demand of the bottles (in production order) with the dispensers.
+
+    Returns a dict with the producible bottle count, the first bottle that
+    cannot be made and one entry per dispenser (demand, stock, run-out).
+    Bottles are reported as first_blocked_<id_name> / empty_at_<id_name>;
+    what-if orders use id_name='position'.
+    """
+    demand, unknown = recipes.demand(bottle_recipes)
+    cumulative = np.cumsum(demand, axis=0)
+
+    levels = {dispenser_id: (level, time) for dispenser_id, level, time in fill_levels}
+    available = np.zeros(len(recipes.granulat_ids))
+    dispenser_of = {}
+    for dispenser_id, granulat_id in dispenser_granulat.items():
+        position = np.searchsorted(recipes.granulat_ids, granulat_id)
+        if position < len(recipes.granulat_ids) and recipes.granulat_ids[position] == granulat_id:
+            level = levels.get(dispenser_id, (0, None))[0]
+            available[position] = level / 100.0 * capacity
+            dispenser_of[position] = dispenser_id
+
+    # Kumulierter Bedarf steigt monoton: Anzahl Flaschen, die noch in den Vorrat passen, je Granulat
+    fits = (cumulative <= available + 1e-9).sum(axis=0) if len(bottle_ids) else np.zeros(len(available), int)
+    needed = demand.any(axis=0)
+    producible = int(fits[needed].min()) if needed.any() else len(bottle_ids)
+
+    dispensers = []
+    for position, granulat_id in enumerate(recipes.granulat_ids):
+        dispenser_id = dispenser_of.get(position)
+        total = float(cumulative[-1, position]) if len(bottle_ids) else 0.0
+        runs_out = bool(fits[position] < len(bottle_ids))
+        entry = {
+            'dispenser_id': dispenser_id,
+            'granulat_id': int(granulat_id),
+            'fill_level': levels.get(dispenser_id, (None, None))[0],
+            'measured': levels.get(dispenser_id, (None, None))[1],
+            'available': float(available[position]),
+            'demand': total,
+            'remaining': float(available[position] - total),
+            'bottles_until_empty': int(fits[position]),
+            f'empty_at_{id_name}': int(bottle_ids[fits[position]]) if runs_out else None,
+        }
+        if runs_out and cycle_seconds:
+            entry['empty_in_seconds'] = float(fits[position] * cycle_seconds)
+        dispensers.append(entry)
+
+    return {
+        'bottles': len(bottle_ids),
+        'unknown_recipe_bottles': unknown,
+        'producible': producible,
+        f'first_blocked_{id_name}': int(bottle_ids[producible]) if producible < len(bottle_ids) else None,
+        'cycle_seconds': cycle_seconds,
+        'dispensers': dispensers,
+    }
+
+
+def order_item(value):
+    recipe, _, count = value.partition('=')
+    try:
+        return int(recipe), int(count)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid --order value {value!r}, expected REZEPT_ID=COUNT")
+
+
+def print_plan(result):
+    if not result['bottles']:
+        print("No bottles to plan - nothing to do.")
+        return
+    # Ungetaggte Flaschen tragen ihre Flaschen_ID, Was-wäre-wenn-Aufträge nur eine Position
+    id_name, label = ('flaschen_id', 'Flaschen_ID') if 'first_blocked_flaschen_id' in result else ('position', 'position')
+    print(f"Bottles planned: {result['bottles']}, producible with current stock: {result['producible']}")
+    if result[f'first_blocked_{id_name}'] is not None:
+        print(f"First bottle that cannot be filled: {label} {result[f'first_blocked_{id_name}']}")
+    if result['unknown_recipe_bottles']:
+        print(f"Bottles with a recipe without granulate list: {result['unknown_recipe_bottles']}")
+    for entry in result['dispensers']:
+        line = (f"Dispenser {entry['dispenser_id']} / Granulat {entry['granulat_id']}: "
+                f"level={entry['fill_level']}% available={entry['available']:.1f} demand={entry['demand']:.1f} "
+                f"remaining={entry['remaining']:.1f}")
+        if entry[f'empty_at_{id_name}'] is not None:
+            line += f" -> empty after {entry['bottles_until_empty']} bottles (at {label} {entry[f'empty_at_{id_name}']}"
+            if 'empty_in_seconds' in entry:
+                line += f", in ~{entry['empty_in_seconds'] / 60:.0f} min"
+            line += ")"
+        print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Plan granulate demand against dispenser fill levels.")
+    parser.add_argument('--db', default=database.DB_PATH)
+    parser.add_argument('--order', nargs='+', type=order_item, metavar='REZEPT_ID=COUNT',
+                        help='Plan a hypothetical order instead of the untagged bottles')
+    parser.add_argument('--capacity', type=float, default=DISPENSER_CAPACITY, help='Amount held by a full dispenser')
+    parser.add_argument('--cycle-seconds', type=float,
+                        help='Seconds per bottle (default: mean station1 cycle from Production_Event)')
+    parser.add_argument('--json', action='store_true')
+    args = parser.parse_args(argv)
+
+    db = database.Database(args.db, read_only=True)
+    try:
+        recipes = RecipeMatrix(db.fetchall(RECIPE_QUERY))
+        if args.order:
+            order = {}
+            for recipe, count in args.order:
+                order[recipe] = order.get(recipe, 0) + count
+            bottle_ids, bottle_recipes = order_bottles(order)
+        else:
+            bottle_ids, bottle_recipes = load_untagged(db)
+        cycle_seconds = args.cycle_seconds or mean_cycle_seconds(db)
+        result = plan(recipes, bottle_ids, bottle_recipes, load_fill_levels(db), args.capacity,
+                      cycle_seconds=cycle_seconds, id_name='position' if args.order else 'flaschen_id')
+    finally:
+        db.close()
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print_plan(result)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
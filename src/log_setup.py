@@ -0,0 +1,37 @@
+"""
+Logging-Konfiguration für Stationen und Line-Controller.
+
+Alle Log-Records laufen über eine Queue an einen einzigen Listener-Thread,
+der in die Log-Datei und auf stdout schreibt. Die Stationen blockieren so
+nicht auf langsamen Schreibzugriffen auf die SD-Karte.
+"""
+import atexit
+import logging
+import logging.handlers
+import queue
+import sys
+
+STDOUT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+
+def setup_logging(log_file, level=logging.DEBUG):
+    """Route all logging through one queue into log_file and stdout; returns the listener."""
+    file_handler = logging.FileHandler(log_file, encoding='utf-8')
+    file_handler.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+
+    # Create a StreamHandler for stdout
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(logging.Formatter(STDOUT_FORMAT))
+
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(log_queue, file_handler, stream_handler)
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.setLevel(level)
+
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
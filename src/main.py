@@ -1,20 +1,135 @@
-import nfc_reader
+"""
+Line-Controller: betreibt Station 1, 2 und 3 gleichzeitig in einem Prozess.
+
+Jede Station läuft in einem eigenen Thread mit eigenem RFID-Reader (eigener
+Chip-Select-Pin am gemeinsamen SPI-Bus). Alle Stationen teilen sich eine
+Logging-Pipeline und eine Metrik-Registry; Station 1 schreibt über die einzige
+schreibende Datenbankverbindung, Station 2 und 3 lesen über eigene
+Read-only-Verbindungen mit gemeinsamem Page-Cache. Läuft der Schreib-Daemon
+(db_writer.py), schreiben alle Stationen wie im Einzelbetrieb über ihn.
+
+    python main.py [--cs station1=D8 --cs station2=D7 --cs station3=D25] [--report-interval 60]
+"""
+import argparse
 import logging
+import os
+import signal
+import threading
+
+import database
+import db_writer
+import log_setup
+import metrics
+import nfc_reader
+import production_ledger
+import qr_codes
+import station1
+import station2
+import station3
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+LOG_FILE = os.path.join(BASE_DIR, 'line.log')
+
+STATIONS = {'station1': station1, 'station2': station2, 'station3': station3}
+
+# Chip-Select-Pins der drei PN532 am SPI-Bus – müssen zur Verdrahtung passen
+DEFAULT_CS_PINS = {'station1': 'D8', 'station2': 'D7', 'station3': 'D25'}
+
+
+def run_station(name, machine):
+    machine.states['State0'].run()
+    if machine.current_state == 'State5':
+        logger.error(f"{name}: reader initialization failed, station stopped.")
+        return
+
+    while not machine.stop_event.is_set():
+        try:
+            machine.run_cycle()
+        except Exception as e:
+            # Ein Fehler in einer Station darf die anderen nicht anhalten
+            logger.exception(f"{name}: unexpected error in cycle: {e}")
+    logger.info(f"{name} stopped.")
+
+
+def parse_cs_pins(values):
+    pins = dict(DEFAULT_CS_PINS)
+    for value in values or []:
+        name, _, pin = value.partition('=')
+        if name not in STATIONS or not pin:
+            raise argparse.ArgumentTypeError(f"invalid --cs value {value!r}, expected stationN=PIN")
+        pins[name] = pin
+    return pins
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run all stations concurrently in one process.")
+    parser.add_argument('--stations', nargs='+', choices=sorted(STATIONS), default=sorted(STATIONS))
+    parser.add_argument('--cs', action='append', metavar='STATION=PIN', help='Chip-select pin of a station reader')
+    parser.add_argument('--db', default=database.DB_PATH, help='Path to flaschen_database.db')
+    parser.add_argument('--no-journal', action='store_true', help='Write directly instead of via the write-behind journal')
+    parser.add_argument('--qr-dir', default=station3.QR_DIR, help='Output directory of station3 QR codes')
+    parser.add_argument('--qr-format', choices=qr_codes.FORMATS, default=station3.QR_FORMAT)
+    parser.add_argument('--spi-baudrate', type=int, default=nfc_reader.SPI_BAUDRATE, help='SPI clock of all readers (Hz)')
+    parser.add_argument('--spi-phase', type=int, choices=[0, 1], default=nfc_reader.SPI_PHASE)
+    parser.add_argument('--nfc-timing', action='store_true', help='Record the duration of every PN532 command')
+    parser.add_argument('--report-interval', type=float, default=60.0, help='Seconds between metric summaries')
+    args = parser.parse_args(argv)
+    cs_pins = parse_cs_pins(args.cs)
+    station3.QR_DIR, station3.QR_FORMAT = args.qr_dir, args.qr_format
+    nfc_reader.SPI_BAUDRATE, nfc_reader.SPI_PHASE = args.spi_baudrate, args.spi_phase
+    nfc_reader.TIMING = nfc_reader.TIMING or args.nfc_timing
+
+    log_setup.setup_logging(LOG_FILE)
+    # Wie station1.py: mit laufendem Schreib-Daemon nur lesen und Schreibzugriffe an ihn senden
+    writer = db_writer.running(args.db)
+    db = database.Database(args.db, read_only=writer is not None, writer=writer)
+    if not args.no_journal:
+        db.enable_journal()
+    registry = metrics.Registry()
+    ledger = production_ledger.EventLedger(db).start()  # Produktions-Ereignisse aller Stationen
+    stop_event = threading.Event()
+
+    def request_stop(signum, frame):
+        logger.info("Stop requested, finishing current cycles...")
+        stop_event.set()
+
+    signal.signal(signal.SIGINT, request_stop)
+    signal.signal(signal.SIGTERM, request_stop)
+
+    threads = []
+    databases = [db]
+    for name in args.stations:
+        # Nur Station 1 schreibt; die Lookup-Stationen bekommen je eine eigene Read-only-Verbindung
+        station_db = db if name == 'station1' else database.Database(args.db, read_only=True, writer=writer)
+        if station_db is not db:
+            databases.append(station_db)
+        machine = STATIONS[name].StateMachine(
+            db=station_db, registry=registry, cs_pin=cs_pins[name], stop_event=stop_event, ledger=ledger
+        )
+        if hasattr(machine, 'start_prefetch'):
+            machine.start_prefetch()  # Station 2/3 lauschen auf von Station 1 getaggte Flaschen
+        thread = threading.Thread(target=run_station, args=(name, machine), name=name, daemon=True)
+        thread.start()
+        threads.append(thread)
+    logger.info(f"Line controller running: {', '.join(args.stations)}"
+                + (f" (writes via writer daemon {writer})" if writer else ""))
 
-if __name__ == "__main__":
+    while not stop_event.wait(args.report_interval):
+        if not any(thread.is_alive() for thread in threads):
+            break
+        registry.log_summary(logger)
 
-    nfc_reader1 = nfc_reader.NFCReader()
+    stop_event.set()
+    for thread in threads:
+        thread.join()
+    registry.log_summary(logger)
+    ledger.stop()
+    for station_db in databases:
+        station_db.close()
+    logger.info("Stopped Execution.")
 
-    logger.info("Waiting for RFID/NFC card...")
-    while True:
-        uid = nfc_reader1.read_passive_target(timeout=0.5)
-        print(".", end="")
-        if uid is None:
-            continue
-        logger.info("Found card with UID: %s", [hex(i) for i in uid])
-        break
 
-    blocks_data = nfc_reader1.read_all_blocks(uid)
-    for block_number, block_data in enumerate(blocks_data):
-        hex_values = " ".join([f"{byte:02x}" for byte in block_data])
-        logger.info("Data in Block %d: %s", block_number, hex_values)
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""
+Prozessweite Metriken (Zähler und Latenz-Histogramme).
+
+Die StateMachines der Stationen tragen die Dauer jedes States und jedes
+Flaschen-Zyklus ein; im Line-Controller teilen sich alle Stationen eine
+Registry. Histogramme behalten die letzten MAX_SAMPLES Werte für Perzentile.
+"""
+import threading
+from collections import deque
+
+MAX_SAMPLES = 10000
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+class Histogram:
+    def __init__(self, max_samples=MAX_SAMPLES):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._samples = deque(maxlen=max_samples)
+
+    def observe(self, value):
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+        self._samples.append(value)
+
+    def summary(self):
+        """Summary in milliseconds (values are recorded in seconds)."""
+        values = sorted(self._samples)
+        return {
+            'count': self.count,
+            'mean_ms': 1000 * self.total / self.count if self.count else 0.0,
+            'p50_ms': 1000 * percentile(values, 0.50),
+            'p95_ms': 1000 * percentile(values, 0.95),
+            'p99_ms': 1000 * percentile(values, 0.99),
+            'max_ms': 1000 * self.max,
+        }
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+
+    def observe(self, name, seconds):
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = Histogram()
+            histogram.observe(seconds)
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'counters': dict(sorted(self._counters.items())),
+                'histograms': {name: h.summary() for name, h in sorted(self._histograms.items())},
+            }
+
+    def log_summary(self, logger):
+        snapshot = self.snapshot()
+        for name, value in snapshot['counters'].items():
+            logger.info(f"{name}: {value}")
+        for name, stats in snapshot['histograms'].items():
+            logger.info(
+                f"{name}: n={stats['count']} mean={stats['mean_ms']:.2f}ms p50={stats['p50_ms']:.2f}ms "
+                f"p95={stats['p95_ms']:.2f}ms p99={stats['p99_ms']:.2f}ms max={stats['max_ms']:.2f}ms"
+            )
+
+
+# Standard-Registry für Stationen, die einzeln laufen
+registry = Registry()
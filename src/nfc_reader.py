@@ -1,10 +1,11 @@
 from abc import ABC, abstractmethod
-import board
-import busio
-from digitalio import DigitalInOut
-from adafruit_pn532.spi import PN532_SPI
+import argparse
 import logging
 import os
+import threading
+import time
+
+import tag_image
 
 
 
@@ -12,6 +13,91 @@ import os
 # Constants
 DEFAULT_KEY_A = bytes([0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF])
 BLOCK_COUNT = 64
+DEFAULT_CS_PIN = 'D8'
+MAX_TARGETS = 2  # mehr Karten gleichzeitig kann InListPassiveTarget nicht melden
+
+# PN532-Kommandos für Zugriffe auf die zweite erkannte Karte (die Adafruit-Methoden sprechen immer Target 1 an)
+_COMMAND_INLISTPASSIVETARGET = 0x4A
+_COMMAND_INDATAEXCHANGE = 0x40
+_MIFARE_ISO14443A = 0x00
+_MIFARE_CMD_AUTH_A = 0x60
+_MIFARE_CMD_READ = 0x30
+_MIFARE_CMD_WRITE = 0xA0
+
+# SPI-Einstellungen je Reader (werden bei jeder Transaktion am gemeinsamen Bus gesetzt).
+# Standard bleiben die 100 kHz der Adafruit-Bibliothek; der PN532 kann bis 5 MHz, was stabil läuft,
+# hängt von Kabellänge und Verdrahtung ab -> mit `python nfc_reader.py calibrate` ermitteln und
+# das Ergebnis über MAFA_SPI_BAUDRATE bzw. main.py --spi-baudrate setzen.
+SPI_BAUDRATE = int(os.environ.get('MAFA_SPI_BAUDRATE', 100000))
+SPI_PHASE = int(os.environ.get('MAFA_SPI_PHASE', 0))
+CALIBRATION_BAUDRATES = (100000, 400000, 1000000, 2000000, 3000000, 4000000, 5000000)
+
+# Zeitmessung je PN532-Kommando (optional, z.B. MAFA_NFC_TIMING=1 oder main.py --nfc-timing)
+TIMING = os.environ.get('MAFA_NFC_TIMING', '0') == '1'
+SLOW_CALL = 0.1  # Sekunden; langsamere Kommandos werden geloggt
+
+COMMAND_NAMES = {
+    0x02: 'GetFirmwareVersion',
+    0x14: 'SAMConfiguration',
+    0x40: 'InDataExchange',
+    0x4A: 'InListPassiveTarget',
+}
+
+# Ein SPI-Bus für alle Reader im Prozess, die Reader unterscheiden sich nur im Chip-Select.
+# Blinkas try_lock ist nicht atomar und wartet aktiv; die Stations-Threads sperren den Bus
+# deshalb über _spi_lock – je SPI-Transfer, nicht je PN532-Kommando: während ein Reader auf
+# die Antwort wartet (leerer Poll bis zum Timeout), können die anderen den Bus nutzen.
+_spi_bus = None
+_spi_lock = threading.Lock()
+_SPI_STATREAD = 0x02
+READY_POLL_INTERVAL = 0.01  # Sekunden zwischen zwei Statusabfragen, wie in adafruit_pn532
+
+
+def _reverse_bit(value):
+    # Der PN532 überträgt LSB zuerst
+    return int(f"{value:08b}"[::-1], 2)
+
+
+class _LockedSPIDevice:
+    """SPIDevice of one reader whose transactions hold the process-wide bus lock."""
+
+    def __init__(self, device):
+        object.__setattr__(self, '_device', device)
+
+    def __getattr__(self, name):
+        return getattr(self._device, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._device, name, value)  # baudrate/phase gelten für das SPIDevice
+
+    def __enter__(self):
+        _spi_lock.acquire()
+        try:
+            return self._device.__enter__()
+        except BaseException:
+            _spi_lock.release()
+            raise
+
+    def __exit__(self, *exc_info):
+        try:
+            return self._device.__exit__(*exc_info)
+        finally:
+            _spi_lock.release()
+
+
+def _wait_ready(spi_device, timeout=1):
+    """Poll the PN532 status byte up to timeout seconds, locking the bus only for each poll."""
+    status_cmd = bytearray([_reverse_bit(_SPI_STATREAD), 0x00])
+    status_response = bytearray([0x00, 0x00])
+    start = time.monotonic()
+    while time.monotonic() - start < timeout:
+        with spi_device as spi:
+            spi.write_readinto(status_cmd, status_response)
+        if _reverse_bit(status_response[1]) == 0x01:
+            return True
+        time.sleep(READY_POLL_INTERVAL)  # ohne Bus-Lock warten
+    return False
+
 
 class NFCReaderInterface(ABC):
 
@@ -20,21 +106,41 @@ class NFCReaderInterface(ABC):
         pass
 
     @abstractmethod
-    def read_block(self, uid, block_number):
+    def read_passive_targets(self, max_targets=MAX_TARGETS, timeout=1):
+        pass
+
+    @abstractmethod
+    def read_block(self, uid, block_number, target=1):
         pass
 
     @abstractmethod
     def read_all_blocks(self, uid):
         pass
     @abstractmethod
-    def write_block(self, uid, block_number, data):
+    def write_block(self, uid, block_number, data, target=1):
+        pass
+
+    @abstractmethod
+    def read_image(self, uid, target=1):
+        pass
+
+    @abstractmethod
+    def write_image(self, uid, desired, current=None, target=1):
         pass
 
 
 
 class NFCReader(NFCReaderInterface):
-    def __init__(self, logger=None):
+    def __init__(self, logger=None, cs_pin=None, baudrate=None, phase=None, registry=None, metrics_prefix='pn532',
+                 timing=None):
         self.logger = logger or logging.getLogger(__name__)  # Verwende den übergebenen Logger oder einen Standard-Logger
+        self.cs_pin = cs_pin or DEFAULT_CS_PIN  # Name des Chip-Select-Pins auf dem Board, z.B. 'D8'
+        self.baudrate = baudrate or SPI_BAUDRATE
+        self.phase = SPI_PHASE if phase is None else phase
+        # Mit registry (metrics.Registry) und timing landet jedes PN532-Kommando als '<prefix>.<Kommando>' im Histogramm
+        self.registry = registry
+        self.metrics_prefix = metrics_prefix
+        self.timing = TIMING if timing is None else timing
         self._pn532 = self.config()
 
     def __getattr__(self, name):
@@ -44,10 +150,28 @@ class NFCReader(NFCReaderInterface):
         return getattr(self._pn532, name)
 
     def config(self):
+        # Hardware-Bibliotheken erst hier laden: der Import von board/busio/adafruit_pn532
+        # kostet auf dem Pi spürbar Zeit und wird nur für die Reader-Initialisierung gebraucht
+        import board
+        import busio
+        from digitalio import DigitalInOut
+        from adafruit_pn532.spi import PN532_SPI
+
+        global _spi_bus
         try:
-            spi = busio.SPI(board.SCK, board.MOSI, board.MISO)
-            cs_pin = DigitalInOut(board.D8)
-            pn532 = PN532_SPI(spi, cs_pin, debug=False)
+            with _spi_lock:
+                if _spi_bus is None:
+                    _spi_bus = busio.SPI(board.SCK, board.MOSI, board.MISO)
+                cs_pin = DigitalInOut(getattr(board, self.cs_pin))
+                pn532 = PN532_SPI(_spi_bus, cs_pin, debug=False)  # weckt den PN532 über den Bus
+            # Ab hier sperrt jeder Transfer den Bus; die Adafruit-Version von _wait_ready hielte
+            # das SPIDevice während des ganzen Polls
+            pn532._spi = _LockedSPIDevice(pn532._spi)
+            pn532._wait_ready = lambda timeout=1: _wait_ready(pn532._spi, timeout)
+            self._configure_spi(pn532, self.baudrate, self.phase)
+            if self.timing and self.registry is not None:
+                # Alle Kommandos (auch die der Adafruit-Methoden) laufen über call_function
+                pn532.call_function = self._timed(pn532.call_function)
 
             ic, ver, rev, support = pn532.firmware_version
             self.logger.info("Found PN532 with firmware version: %d.%d", ver, rev)
@@ -60,16 +184,95 @@ class NFCReader(NFCReaderInterface):
             raise
 
 
-    def read_block(self, uid, block_number):
-        try:
-            authenticated = self._pn532.mifare_classic_authenticate_block(
-                uid, block_number, 0x60, key=DEFAULT_KEY_A
+    @staticmethod
+    def _configure_spi(pn532, baudrate, phase):
+        # SPIDevice konfiguriert den Bus vor jeder Transaktion mit diesen Werten
+        pn532._spi.baudrate = baudrate
+        pn532._spi.phase = phase
+
+    def set_baudrate(self, baudrate):
+        self.baudrate = baudrate
+        self._configure_spi(self._pn532, baudrate, self.phase)
+
+    def _timed(self, call_function):
+        def timed_call(command, *args, **kwargs):
+            name = COMMAND_NAMES.get(command, f"0x{command:02x}")
+            start = time.perf_counter()
+            try:
+                return call_function(command, *args, **kwargs)
+            except Exception:
+                self.registry.incr(f"{self.metrics_prefix}.{name}.error")
+                raise
+            finally:
+                elapsed = time.perf_counter() - start
+                self.registry.observe(f"{self.metrics_prefix}.{name}", elapsed)
+                if elapsed > SLOW_CALL and command != _COMMAND_INLISTPASSIVETARGET:  # Polls warten aufs Timeout
+                    self.logger.warning("Slow PN532 command %s on %s: %.1f ms", name, self.cs_pin, elapsed * 1000)
+        return timed_call
+
+    def read_passive_targets(self, max_targets=MAX_TARGETS, timeout=1):
+        """
+        Detect up to max_targets MiFare cards in one InListPassiveTarget round.
+
+        Returns the UIDs in target order (empty list on timeout). The n-th UID is
+        PN532 target n+1, which read_block/write_block expect as `target` until
+        the next detection round.
+        """
+        response = self._pn532.call_function(
+            _COMMAND_INLISTPASSIVETARGET,
+            params=[max(1, min(max_targets, MAX_TARGETS)), _MIFARE_ISO14443A],
+            response_length=64,
+            timeout=timeout,
+        )
+        if not response:
+            return []
+
+        uids = []
+        offset = 1
+        for _ in range(response[0]):
+            # Tg, SENS_RES (2 Byte), SEL_RES, NFCIDLength, NFCID1
+            sel_res = response[offset + 3]
+            uid_length = response[offset + 4]
+            uids.append(bytearray(response[offset + 5:offset + 5 + uid_length]))
+            offset += 5 + uid_length
+            if sel_res & 0x20:
+                offset += response[offset]  # ATS (nur ISO14443-4-Karten), erstes Byte ist die Länge
+        return uids
+
+    def _authenticate(self, uid, block_number, target):
+        if target == 1:
+            return self._pn532.mifare_classic_authenticate_block(
+                uid, block_number, _MIFARE_CMD_AUTH_A, key=DEFAULT_KEY_A
             )
+        params = bytes([target, _MIFARE_CMD_AUTH_A, block_number & 0xFF]) + DEFAULT_KEY_A + bytes(uid)
+        response = self._pn532.call_function(_COMMAND_INDATAEXCHANGE, params=params, response_length=1)
+        return response is not None and response[0] == 0x00
+
+    def _read(self, block_number, target):
+        if target == 1:
+            return self._pn532.mifare_classic_read_block(block_number)
+        response = self._pn532.call_function(
+            _COMMAND_INDATAEXCHANGE, params=[target, _MIFARE_CMD_READ, block_number & 0xFF], response_length=17
+        )
+        if response is None or response[0] != 0x00:
+            return None
+        return response[1:]
+
+    def _write(self, block_number, data, target):
+        if target == 1:
+            return self._pn532.mifare_classic_write_block(block_number, data)
+        params = bytes([target, _MIFARE_CMD_WRITE, block_number & 0xFF]) + bytes(data)
+        response = self._pn532.call_function(_COMMAND_INDATAEXCHANGE, params=params, response_length=1)
+        return response is not None and response[0] == 0x00
+
+    def read_block(self, uid, block_number, target=1):
+        try:
+            authenticated = self._authenticate(uid, block_number, target)
             if not authenticated:
                 self.logger.error("Failed to authenticate block %d", block_number)
                 return None
 
-            block_data = self._pn532.mifare_classic_read_block(block_number)
+            block_data = self._read(block_number, target)
             if block_data is None:
                 self.logger.error("Failed to read block %d", block_number)
                 return None
@@ -89,16 +292,14 @@ class NFCReader(NFCReaderInterface):
                 self.logger.warning("No data read from Block %d", block_number)
         return blocks_data
 
-    def write_block(self, uid, block_number, data):
+    def write_block(self, uid, block_number, data, target=1):
         try:
-            authenticated = self._pn532.mifare_classic_authenticate_block(
-                uid, block_number, 0x60, key=DEFAULT_KEY_A
-            )
+            authenticated = self._authenticate(uid, block_number, target)
             if not authenticated:
                 self.logger.error("Failed to authenticate block %d for writing", block_number)
                 return False
 
-            success = self._pn532.mifare_classic_write_block(block_number, data)
+            success = self._write(block_number, data, target)
             if not success:
                 self.logger.error("Failed to write to block %d", block_number)
                 return False
@@ -109,23 +310,160 @@ class NFCReader(NFCReaderInterface):
             self.logger.exception("Error writing block %d: %s", block_number, e)
             return False
 
+    def read_image(self, uid, target=1):
+        """
+        Whole tag as one bytes object (see tag_image), or None if a block is unreadable.
+
+        Authenticates once per sector instead of once per block like read_block,
+        which saves 48 of 64 authentications.
+        """
+        blocks = []
+        try:
+            for block_number in range(BLOCK_COUNT):
+                if block_number % tag_image.BLOCKS_PER_SECTOR == 0:
+                    if not self._authenticate(uid, block_number, target):
+                        self.logger.error("Failed to authenticate sector %d", tag_image.sector_of(block_number))
+                        return None
+                block_data = self._read(block_number, target)
+                if block_data is None:
+                    self.logger.error("Failed to read block %d", block_number)
+                    return None
+                blocks.append(block_data)
+        except Exception as e:
+            self.logger.exception("Error reading tag image: %s", e)
+            return None
+        return tag_image.from_blocks(blocks)
+
+    def write_image(self, uid, desired, current=None, target=1):
+        """
+        Bring the tag to the desired image by writing only the changed data blocks.
 
+        current is the image read before (read from the tag if None). Returns
+        the list of written block numbers, or None if reading or writing failed.
+        """
+        current = current if current is not None else self.read_image(uid, target)
+        if current is None:
+            return None
+        written = []
+        try:
+            for sector, block_numbers in tag_image.diff(current, desired).items():
+                if not self._authenticate(uid, block_numbers[0], target):
+                    self.logger.error("Failed to authenticate sector %d for writing", sector)
+                    return None
+                for block_number in block_numbers:
+                    if not self._write(block_number, tag_image.block(desired, block_number), target):
+                        self.logger.error("Failed to write to block %d", block_number)
+                        return None
+                    written.append(block_number)
+        except Exception as e:
+            self.logger.exception("Error writing tag image: %s", e)
+            return None
+        self.logger.info("Tag image written: %d blocks changed %s", len(written), written)
+        return written
 
 
-if __name__ == "__main__":
 
-    nfc_reader = NFCReader()
+def calibrate(cs_pin=DEFAULT_CS_PIN, baudrates=CALIBRATION_BAUDRATES, iterations=50, phase=None, logger=None):
+    """
+    Sweep SPI baudrates with GetFirmwareVersion round trips.
+
+    Returns one dict per rate (errors, mean/max latency) and the fastest rate
+    that completed all iterations without an error (None if none did).
+    """
+    logger = logger or logging.getLogger(__name__)
+    reader = NFCReader(logger=logger, cs_pin=cs_pin, baudrate=min(baudrates), phase=phase, timing=False)
+    results = []
+    best = None
+    stable = True
+    for baudrate in sorted(baudrates):
+        reader.set_baudrate(baudrate)
+        errors = 0
+        durations = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            try:
+                if reader.firmware_version is None:
+                    errors += 1
+            except Exception:
+                errors += 1  # Prüfsummen-/Rahmenfehler bei zu hohem Takt
+            durations.append(time.perf_counter() - start)
+        results.append({
+            'baudrate': baudrate,
+            'errors': errors,
+            'mean_ms': 1000 * sum(durations) / len(durations),
+            'max_ms': 1000 * max(durations),
+        })
+        stable = stable and errors == 0  # oberhalb des ersten Fehlers gilt keine Rate als sicher
+        if stable:
+            best = baudrate
+    reader.set_baudrate(best or min(baudrates))
+    return results, best
 
-    self.logger.info("Waiting for RFID/NFC card...")
+
+def wait_for_card(reader, logger):
+    logger.info("Waiting for RFID/NFC card...")
     while True:
-        uid = nfc_reader.read_passive_target(timeout=0.5)
+        uid = reader.read_passive_target(timeout=0.5)
         print(".", end="")
         if uid is None:
             continue
-        self.logger.info("Found card with UID: %s", [hex(i) for i in uid])
-        break
+        logger.info("Found card with UID: %s", [hex(i) for i in uid])
+        return uid
+
 
-    blocks_data = nfc_reader.read_all_blocks(uid)
+def dump_card(reader, logger):
+    uid = wait_for_card(reader, logger)
+    blocks_data = reader.read_all_blocks(uid)
     for block_number, block_data in enumerate(blocks_data):
         hex_values = ' '.join([f'{byte:02x}' for byte in block_data])
-        self.logger.info("Data in Block %d: %s", block_number, hex_values)
\ No newline at end of file
+        logger.info("Data in Block %d: %s", block_number, hex_values)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Dump, snapshot or rewrite a MiFare card, or calibrate the SPI bus.")
+    parser.add_argument('command', nargs='?', choices=['dump', 'snapshot', 'write-image', 'calibrate'], default='dump')
+    parser.add_argument('--image', help='Tag image file (1024 bytes) for snapshot / write-image')
+    parser.add_argument('--cs', default=DEFAULT_CS_PIN, help='Chip-select pin of the reader, e.g. D8')
+    parser.add_argument('--phase', type=int, choices=[0, 1], default=SPI_PHASE)
+    parser.add_argument('--rates', nargs='+', type=int, default=CALIBRATION_BAUDRATES, help='Baudrates to test (Hz)')
+    parser.add_argument('--iterations', type=int, default=50, help='Round trips per baudrate')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    logger = logging.getLogger(__name__)
+    if args.command == 'dump':
+        dump_card(NFCReader(logger=logger, cs_pin=args.cs, phase=args.phase), logger)
+        return 0
+    if args.command in ('snapshot', 'write-image'):
+        if not args.image:
+            parser.error(f"{args.command} needs --image")
+        reader = NFCReader(logger=logger, cs_pin=args.cs, phase=args.phase)
+        uid = wait_for_card(reader, logger)
+        if args.command == 'snapshot':
+            image = reader.read_image(uid)
+            if image is None:
+                return 1
+            with open(args.image, 'wb') as f:
+                f.write(image)
+            print(f"Tag image of {bytes(uid).hex()} written to {args.image}")
+            return 0
+        with open(args.image, 'rb') as f:
+            written = reader.write_image(uid, f.read())
+        if written is None:
+            return 1
+        print(f"{len(written)} blocks rewritten: {written}")
+        return 0
+
+    results, best = calibrate(args.cs, args.rates, args.iterations, args.phase, logger)
+    for result in results:
+        print(f"{result['baudrate']:>9} Hz  errors={result['errors']:<4} "
+              f"mean={result['mean_ms']:.2f}ms max={result['max_ms']:.2f}ms")
+    if best is None:
+        print("No baudrate ran without errors - check wiring and SPI phase.")
+        return 1
+    print(f"Fastest error-free baudrate: {best} Hz (export MAFA_SPI_BAUDRATE={best})")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
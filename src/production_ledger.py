@@ -0,0 +1,161 @@
+"""
+Produktions-Ereignisse je Flasche in der Tabelle Production_Event.
+
+Jede StateMachine meldet nach einem Flaschen-Zyklus die durchlaufenen States
+(Start, Ende, Folge-State) und den Zyklus selbst (Outcome State4/State5). Die
+Ereignisse werden im Speicher gepuffert und von einem Hintergrund-Thread
+periodisch mit executemany in einer Transaktion eingefügt; die Station wartet
+nie auf die Datenbank. Schlägt das Einfügen fehl (z.B. gesperrt), bleiben die
+Ereignisse im Puffer, der Puffer ist aber begrenzt. Ist unklar, ob der
+Schreib-Daemon die Ereignisse angewendet hat (Verbindung vor der Bestätigung
+verloren), werden sie nicht erneut eingefügt: lieber fehlen einzelne
+Ereignisse, als dass Zyklen doppelt gezählt werden.
+
+Auswertung der Zykluszeiten je Station:
+
+    python production_ledger.py --since "2024-12-04 00:00:00"
+"""
+import argparse
+import atexit
+import datetime
+import logging
+import sys
+import threading
+
+import database
+import db_writer
+
+FLUSH_INTERVAL = 2.0  # Sekunden
+MAX_BUFFER = 10000
+MAX_BACKOFF = 30.0
+
+INSERT_EVENT = """
+INSERT INTO Production_Event (Flaschen_ID, Station, State, Start_Time, End_Time, Outcome)
+VALUES (?, ?, ?, ?, ?, ?)
+"""
+
+CYCLE_REPORT = """
+SELECT Station, COUNT(*), SUM(Outcome = 'State4'),
+       AVG((julianday(End_Time) - julianday(Start_Time)) * 86400000.0),
+       MIN(Start_Time), MAX(End_Time)
+FROM Production_Event
+WHERE State = 'cycle' AND Start_Time >= ? AND Start_Time < ?
+GROUP BY Station
+ORDER BY Station
+"""
+
+
+def timestamp(seconds):
+    """Epoch seconds -> UTC text with milliseconds, readable by SQLite's date functions."""
+    return datetime.datetime.fromtimestamp(seconds, datetime.timezone.utc).strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
+
+
+class EventLedger:
+    def __init__(self, db, flush_interval=FLUSH_INTERVAL, max_buffer=MAX_BUFFER, logger=None):
+        self.db = db
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self.logger = logger or logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._buffer = []
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def record(self, station, flaschen_id, state, start, end, outcome):
+        """Buffer one event; start and end are epoch seconds (time.time())."""
+        self.record_many([(flaschen_id, station, state, start, end, outcome)])
+
+    def record_cycle(self, station, flaschen_id, states):
+        """Buffer the (state, start, end, next_state) steps of one bottle plus a 'cycle' event."""
+        if not states:
+            return
+        events = [(flaschen_id, station, state, start, end, outcome) for state, start, end, outcome in states]
+        events.append((flaschen_id, station, 'cycle', states[0][1], states[-1][2], states[-1][3]))
+        self.record_many(events)
+
+    def record_many(self, events):
+        with self._lock:
+            self._buffer.extend(events)
+            overflow = len(self._buffer) - self.max_buffer
+            if overflow > 0:
+                # Datenbank länger nicht erreichbar: lieber alte Ereignisse verwerfen als Speicher
+                del self._buffer[:overflow]
+                self.logger.warning(f"Production event buffer full, dropped {overflow} events")
+
+    def flush(self):
+        """Insert all buffered events in one transaction; returns the number inserted."""
+        with self._lock:
+            events, self._buffer = self._buffer, []
+        if not events:
+            return 0
+        rows = [
+            (flaschen_id, station, state, timestamp(start), timestamp(end), outcome)
+            for flaschen_id, station, state, start, end, outcome in events
+        ]
+        try:
+            self.db.executemany(INSERT_EVENT, rows)
+        except db_writer.AckLostError as e:
+            self.logger.warning(f"{len(rows)} production events possibly not recorded: {e}")
+            return 0
+        except Exception:
+            with self._lock:
+                self._buffer[:0] = events  # beim nächsten Flush erneut versuchen
+            raise
+        return len(rows)
+
+    def _run(self):
+        backoff = self.flush_interval
+        while not self._stopped.wait(backoff):
+            try:
+                self.flush()
+                backoff = self.flush_interval
+            except Exception as e:
+                backoff = min(MAX_BACKOFF, backoff * 2)
+                self.logger.warning(f"Production event flush failed, retrying in {backoff:.1f}s: {e}")
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='event-ledger', daemon=True)
+            self._thread.start()
+            atexit.register(self.stop)
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        try:
+            self.flush()
+        except Exception as e:
+            self.logger.error(f"Final production event flush failed, {len(self._buffer)} events lost: {e}")
+
+
+def cycle_report(db, since, until):
+    """Per station: cycles, successful cycles, mean cycle time (ms), first start, last end."""
+    return db.fetchall(CYCLE_REPORT, (since, until))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Summarize cycle times per station from Production_Event.")
+    parser.add_argument('--db', default=database.DB_PATH)
+    parser.add_argument('--since', default='0000-01-01 00:00:00', help='UTC start of the time window')
+    parser.add_argument('--until', default='9999-12-31 23:59:59', help='UTC end of the time window')
+    args = parser.parse_args(argv)
+
+    db = database.Database(args.db, read_only=True)
+    try:
+        rows = cycle_report(db, args.since, args.until)
+    except Exception as e:
+        print(f"No production events available: {e}", file=sys.stderr)
+        return 1
+    finally:
+        db.close()
+    for station, cycles, ok, mean_ms, first, last in rows:
+        print(f"{station}: cycles={cycles} ok={ok} failed={cycles - ok} "
+              f"mean_cycle={mean_ms:.1f}ms first={first} last={last}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,124 @@
+"""
+Kompakte QR-Payload und schnelle Render-Backends für Station 3.
+
+Payload (nur Ziffern, damit der QR-Code im Numeric-Mode kodiert wird):
+
+    V RRR FFFFFFFF YYMMDDhhmmss
+    1 003 00000027 241204101200
+
+V = Payload-Version, RRR = Rezept_ID, FFFFFFFF = Flaschen_ID und der
+Tagged_Date-Zeitstempel. 24 Ziffern passen in QR-Version 1 mit Fehler-
+korrektur Q (max. 27 Ziffern), die Symbolgröße ist damit fest 21x21 Module.
+
+Backends schreiben direkt aus der Modulmatrix, ohne PIL:
+'png' (1-Bit-Graustufen), 'svg' und 'raw' (gepackte 1-Bit-Zeilen, 1 = schwarz,
+MSB zuerst, ohne Header – für den Etikettendrucker).
+"""
+import os
+import struct
+import zlib
+
+PAYLOAD_VERSION = '1'
+PAYLOAD_LENGTH = 24
+QR_VERSION = 1
+BORDER = 4
+DEFAULT_BOX_SIZE = 4
+
+FORMATS = ('png', 'svg', 'raw')
+EXTENSIONS = {'png': '.png', 'svg': '.svg', 'raw': '.bin'}
+
+
+def encode_payload(rezept_id, flaschen_id, tagged_date):
+    """Build the numeric payload; tagged_date is 'YYYY-MM-DD HH:MM:SS' or 0/None when untagged."""
+    if not 0 <= int(rezept_id) <= 999 or not 0 <= int(flaschen_id) <= 99999999:
+        raise ValueError(f"Rezept_ID {rezept_id} or Flaschen_ID {flaschen_id} out of payload range")
+    digits = ''.join(ch for ch in str(tagged_date or '') if ch.isdigit())
+    timestamp = digits[2:14] if len(digits) >= 14 else '0' * 12
+    return f"{PAYLOAD_VERSION}{int(rezept_id):03d}{int(flaschen_id):08d}{timestamp}"
+
+
+def decode_payload(payload):
+    """Inverse of encode_payload; returns a dict with rezept_id, flaschen_id and tagged_date."""
+    if len(payload) != PAYLOAD_LENGTH or not payload.isdigit() or payload[0] != PAYLOAD_VERSION:
+        raise ValueError(f"Unsupported QR payload {payload!r}")
+    ts = payload[12:]
+    tagged_date = None
+    if ts != '0' * 12:
+        tagged_date = f"20{ts[0:2]}-{ts[2:4]}-{ts[4:6]} {ts[6:8]}:{ts[8:10]}:{ts[10:12]}"
+    return {'rezept_id': int(payload[1:4]), 'flaschen_id': int(payload[4:12]), 'tagged_date': tagged_date}
+
+
+def encode_matrix(payload):
+    """QR module matrix (list of rows, True = dark) including the quiet zone."""
+    import qrcode  # erst hier laden, der Import ist teuer
+    from qrcode.util import QRData, MODE_NUMBER
+
+    qr = qrcode.QRCode(
+        version=QR_VERSION,  # fest: die Payload passt immer in Version 1
+        error_correction=qrcode.constants.ERROR_CORRECT_Q,
+        border=BORDER,
+    )
+    qr.add_data(QRData(payload, mode=MODE_NUMBER))
+    qr.make(fit=False)
+    return qr.get_matrix()
+
+
+def _pack_bits(bits):
+    packed = bytearray((len(bits) + 7) // 8)
+    for i, bit in enumerate(bits):
+        if bit:
+            packed[i >> 3] |= 0x80 >> (i & 7)
+    return bytes(packed)
+
+
+def _scaled_rows(matrix, box_size, dark_bit):
+    """Packed 1-bit rows of the matrix scaled by box_size; dark modules become dark_bit."""
+    for row in matrix:
+        line = _pack_bits([dark == dark_bit for dark in row for _ in range(box_size)])
+        for _ in range(box_size):
+            yield line
+
+
+def render_png(matrix, box_size=DEFAULT_BOX_SIZE):
+    size = len(matrix) * box_size
+    # 1-Bit-Graustufen: 1 = weiß, jede Zeile mit Filterbyte 0
+    raw = b''.join(b'\x00' + line for line in _scaled_rows(matrix, box_size, dark_bit=False))
+
+    def chunk(tag, data):
+        return struct.pack('>I', len(data)) + tag + data + struct.pack('>I', zlib.crc32(tag + data) & 0xFFFFFFFF)
+
+    header = struct.pack('>IIBBBBB', size, size, 1, 0, 0, 0, 0)
+    return b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', header) + chunk(b'IDAT', zlib.compress(raw, 9)) + chunk(b'IEND', b'')
+
+
+def render_svg(matrix, box_size=DEFAULT_BOX_SIZE):
+    modules = len(matrix)
+    path = ''.join(
+        f"M{x},{y}h1v1h-1z" for y, row in enumerate(matrix) for x, dark in enumerate(row) if dark
+    )
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{modules * box_size}" height="{modules * box_size}" '
+        f'viewBox="0 0 {modules} {modules}" shape-rendering="crispEdges">'
+        f'<rect width="{modules}" height="{modules}" fill="#fff"/><path fill="#000" d="{path}"/></svg>'
+    ).encode('utf-8')
+
+
+def render_raw(matrix, box_size=DEFAULT_BOX_SIZE):
+    return b''.join(_scaled_rows(matrix, box_size, dark_bit=True))
+
+
+RENDERERS = {'png': render_png, 'svg': render_svg, 'raw': render_raw}
+
+
+def write(matrix, directory, name, fmt='png', box_size=DEFAULT_BOX_SIZE):
+    """Render matrix with the chosen backend into directory/name.<ext>; returns the path."""
+    if fmt not in RENDERERS:
+        raise ValueError(f"Unknown QR format {fmt!r}, expected one of {', '.join(FORMATS)}")
+    data = RENDERERS[fmt](matrix, box_size)
+    os.makedirs(directory, exist_ok=True)  # --qr-dir darf noch nicht existieren
+    path = os.path.join(directory, name + EXTENSIONS[fmt])
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)  # der Drucker sieht nie eine halb geschriebene Datei
+    return path
@@ -1,103 +1,53 @@
 import logging
-import nfc_reader
-import sqlite3
-import sys
+import bottle_events
+import database
+import log_setup
+import station_base
+import datetime
 import os
 # Initialize logger
 
 logger = logging.getLogger(__name__)
 
-# Create a logger
-log_file_path = os.path.expanduser('~/MaFa_P5.1/src/station1.log')
-logging.basicConfig(filename=log_file_path, encoding='utf-8', level=logging.DEBUG)
-logger.setLevel(logging.DEBUG)  # Set the desired logging level
+# Pfade relativ zu dieser Datei, damit die Station aus jedem Arbeitsverzeichnis startet
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DB_PATH = database.DB_PATH
 
-# Create a StreamHandler for stdout
-handler = logging.StreamHandler(sys.stdout)
+# Erst bei Bedarf importierte Module; station_daemon.py lädt sie beim Start vor
+PRELOAD_MODULES = ['sqlite3']
 
-# Create a formatter and set it for the handler
-formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-handler.setFormatter(formatter)
+NAME = 'station1'
+LOG_FILE = os.path.join(BASE_DIR, 'station1.log')
 
-# Add the handler to the logger
-logger.addHandler(handler)
+TAG_QUERY = """
+            UPDATE Flasche
+            SET Tagged_Date = ?
+            WHERE Flaschen_ID = ?;
+            """
 
-#logger.info("test")
 
-class StateMachine:
-    def __init__(self):
-        self.current_state = 'State0'
+def last_pending_flaschen_id(db):
+    """Highest Flaschen_ID whose tagging still waits in the write-behind journal, 0 if none."""
+    if db.journal is None:
+        return 0
+    return max([params[1] for query, params in db.journal.pending_statements() if query == TAG_QUERY], default=0)
+
+class StateMachine(station_base.StationMachine):
+    def __init__(self, db=None, registry=None, cs_pin=None, stop_event=None, ledger=None):
+        super().__init__(NAME, logger, db=db, db_path=DB_PATH, writes=True, registry=registry, cs_pin=cs_pin,
+                         stop_event=stop_event, ledger=ledger)
+        self.last_flaschen_id = 0  # zuletzt getaggte Flasche dieses Laufs
         self.states = {
-            'State0': State0(self),
-            'State1': State1(self),
+            'State0': station_base.State0(self),
+            'State1': station_base.State1(self),
             'State2': State2(self),
             'State3': State3(self),
-            'State4': State4(self),
-            'State5': State5(self)
+            'State4': station_base.State4(self),
+            'State5': station_base.State5(self)
         }
 
-    def run(self):
-        while self.current_state not in ['State5']:
-            state = self.states[self.current_state]
-            state.run()  # Run the current state
-
-class State:
-    def __init__(self, machine):
-        self.machine = machine
-
-    def run(self):
-        raise NotImplementedError("State must implement 'run' method.")
-
-class State0(State):
-    def run(self):
-        logger.info("Initializing RFID reader...")
-        
-        self.machine.reader = nfc_reader.NFCReader(logger=logger) 
-        init_successful = False
-        try:
-            self.machine.reader.config()
-            init_successful = True  # Set to True if no exception occurs
-        except Exception as e:
-            logger.error(f"Error initializing reader: {e}")
-            init_successful = False
-
-        if init_successful:
-            logger.info("RFID reader initialized successfully.")
-            self.machine.current_state = 'State1'  # Transition to State1
-        else:
-            logger.error("Failed to initialize RFID reader.")
-            self.machine.current_state = 'State5'  # Transition to State5
-
-
-class State1(State): 
-    def run(self):
-        logger.info("Waiting for RFID card...")
-        
-        # Zugriff auf den Reader
-        reader = self.machine.reader
-        if reader is None:
-            logger.error("No RFID reader available!")
-            self.machine.current_state = 'State5'  # Transition to State5
-            return
-        
-        # Simulate card detection (replace with actual detection code)
-        while True:
-            self.machine.uid = reader.read_passive_target(timeout=0.5)
-            print(".", end="")
-            if self.machine.uid is None:
-                continue
-            logger.info("Found card with UID: %s", [hex(i) for i in self.machine.uid])
-            break
-        
-        if self.machine.uid is None:
-            logger.warning("No card detected. Retrying...")
-            self.machine.current_state = 'State1'  # Wait again
-        else:
-            logger.info(f"Found card with UID: {[hex(i) for i in self.machine.uid]}") 
-            self.machine.current_state = 'State2'  # Transition to State2
-
 
-class State2(State):
+class State2(station_base.State):
     def run(self):
         logger.info("Writing Bottle ID to card...")
 
@@ -112,24 +62,20 @@ class State2(State):
 
         # SQL: Hole die erste ungetaggte Flaschen_ID
         try:
-            
-            db_path = "../data/flaschen_database.db"
-            conn = sqlite3.connect(db_path)
-            cursor = conn.cursor()
-
             query = """
-            SELECT Flaschen_ID
+            SELECT Flaschen_ID, Rezept_ID
             FROM Flasche
-            WHERE Tagged_Date IS 0
+            WHERE Tagged_Date IS 0 AND Flaschen_ID > ?
             ORDER BY Flaschen_ID ASC
             LIMIT 1;
             """
-            cursor.execute(query)
-            result = cursor.fetchone()
-            conn.close()
+            # Nur hinter der zuletzt getaggten Flasche suchen: deren Update kann noch im Journal stehen,
+            # nach einem Neustart auch das eines früheren Laufs (wird im Hintergrund nachgespielt)
+            last_flaschen_id = max(self.machine.last_flaschen_id, last_pending_flaschen_id(self.machine.db))
+            result = self.machine.db.fetchone(query, (last_flaschen_id,))
             
             if result:
-                self.machine.flaschen_id = result[0]
+                self.machine.flaschen_id, self.machine.rezept_id = result
             else:
                 logger.error("No untagged bottles available!")
                 self.machine.current_state = 'State1'  # Zurück zu State1, um es erneut zu versuchen
@@ -151,7 +97,7 @@ class State2(State):
 
         # Schreibe die Daten auf den NFC-Tag
         try:
-            write_successful = reader.write_block(uid, block_number, data)
+            write_successful = reader.write_block(uid, block_number, data, target=self.machine.target)
         except Exception as e:
             logger.error(f"Error writing to card: {e}")
             write_successful = False
@@ -165,7 +111,7 @@ class State2(State):
             self.machine.current_state = 'State1'  # Zurück zu State1
 
 
-class State3(State):
+class State3(station_base.State):
     def run(self):
         logger.info("Saving Bottle ID and timestamp to database...")
         
@@ -173,19 +119,19 @@ class State3(State):
                     
         # SQL: Aktualisiere die Datenbank, um die Flasche als getaggt zu markieren
         db_write_successful=False
+        # Zeitstempel wie CURRENT_TIMESTAMP (UTC), aber hier erzeugt, damit er mit dem Event verschickt werden kann
+        tagged_date = datetime.datetime.now(datetime.timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
         try:
-            db_path = "../data/flaschen_database.db"
-            conn = sqlite3.connect(db_path)
-            cursor = conn.cursor()
-
-            update_query = """
-            UPDATE Flasche
-            SET Tagged_Date = CURRENT_TIMESTAMP
-            WHERE Flaschen_ID = ?;
+            # Karten-UID merken: Station 2 und 3 finden die Flasche dann ohne den Block zu lesen
+            uid_query = """
+            INSERT OR REPLACE INTO Flasche_UID (UID, Flaschen_ID)
+            VALUES (?, ?);
             """
-            cursor.execute(update_query, (self.machine.flaschen_id,))
-            conn.commit()
-            conn.close()
+            self.machine.db.submit_many([
+                (TAG_QUERY, (tagged_date, self.machine.flaschen_id)),
+                (uid_query, (database.uid_hex(self.machine.uid), self.machine.flaschen_id)),
+            ])
+            self.machine.last_flaschen_id = self.machine.flaschen_id
             db_write_successful = True  
         except Exception as e:
             logger.error(f"Error updating database: {e}")
@@ -193,25 +139,23 @@ class State3(State):
         
         if db_write_successful:
             logger.info("Successfully saved to database.")
+            # Station 2 und 3 laden die Daten dieser Flasche schon vor, bevor sie dort ankommt
+            bottle_events.publish({
+                'flaschen_id': self.machine.flaschen_id,
+                'uid': database.uid_hex(self.machine.uid),
+                'rezept_id': self.machine.rezept_id,
+                'tagged_date': tagged_date,
+            })
             self.machine.current_state = 'State4'  # Transition to State4
         else:
             logger.error("Failed to save data to database.")
             self.machine.current_state = 'State5'  # Transition to State5
 
-class State4(State):
-    def run(self):
-        logger.info("Successfully completed the process! Returning to State1.")
-        quit()
-        # Transition back to State1 - probably not hepful while debugging
-        #self.machine.current_state = 'State1'  
-
-class State5(State):
-    def run(self):
-        logger.error("Process failed at some point. Please check the logs.")
-        self.machine.current_state = 'State5'  # End of process
-
 # Main execution
 if __name__ == '__main__':
+    log_setup.setup_logging(LOG_FILE)
     machine = StateMachine()
+    # Auch mit Schreib-Daemon: das Journal sichert Tagged_Date, bevor die Flasche als fertig gilt
+    machine.db.enable_journal()
     machine.run()
     logger.info("Stopped Execution. Please rerun the program to start again.")
\ No newline at end of file
@@ -1,191 +1,84 @@
 import logging
-import nfc_reader
-import sqlite3
-import sys
+import database
+import qr_codes
+import log_setup
+import station_base
 import os
-import qrcode  ##Über pip einbinden !!!!!!!!!!!!!!!!!!!!!!!!!!
 # Initialize logger
 
 logger = logging.getLogger(__name__)
 
-# Create a logger
-log_file_path = os.path.expanduser('~/MaFa_P5.1/src/station3.log')
-logging.basicConfig(filename=log_file_path, encoding='utf-8', level=logging.DEBUG)
-logger.setLevel(logging.DEBUG)  # Set the desired logging level
+# Pfade relativ zu dieser Datei, damit die Station aus jedem Arbeitsverzeichnis startet
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DB_PATH = database.DB_PATH
+# Ausgabe der QR-Codes, per Umgebungsvariable oder main.py --qr-dir/--qr-format einstellbar
+QR_DIR = os.environ.get('MAFA_QR_DIR', os.path.join(BASE_DIR, 'QR_CODES'))
+QR_FORMAT = os.environ.get('MAFA_QR_FORMAT', 'png')  # 'png', 'svg' oder 'raw' (Etikettendrucker)
+QR_BOX_SIZE = int(os.environ.get('MAFA_QR_BOX_SIZE', qr_codes.DEFAULT_BOX_SIZE))
 
-# Create a StreamHandler for stdout
-handler = logging.StreamHandler(sys.stdout)
+# Erst bei Bedarf importierte Module; station_daemon.py lädt sie beim Start vor
+PRELOAD_MODULES = ['sqlite3', 'qrcode', 'qrcode.util']
 
-# Create a formatter and set it for the handler
-formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-handler.setFormatter(formatter)
+NAME = 'station3'
 
-# Add the handler to the logger
-logger.addHandler(handler)
 
-#logger.info("test")
+def build_qr(rezept_id, flaschen_id, tagged_date):
+    """Encode the compact QR payload of a bottle; the returned module matrix only needs rendering."""
+    return qr_codes.encode_matrix(qr_codes.encode_payload(rezept_id, flaschen_id, tagged_date))
 
-class StateMachine:
-    def __init__(self):
-        self.current_state = 'State0'
+LOG_FILE = os.path.join(BASE_DIR, 'station3.log')
+
+class StateMachine(station_base.LookupMachine):
+    def __init__(self, db=None, registry=None, cs_pin=None, stop_event=None, ledger=None):
+        # Station liest nur; Produktions-Ereignisse gehen über den Schreib-Daemon, falls er läuft
+        super().__init__(NAME, logger, db=db, db_path=DB_PATH, registry=registry, cs_pin=cs_pin,
+                         stop_event=stop_event, ledger=ledger)
         self.states = {
-            'State0': State0(self),
-            'State1': State1(self),
-            'State2': State2(self),
+            'State0': station_base.State0(self),
+            'State1': station_base.State1(self),
+            'State2': station_base.ReadBottleId(self),
             'State3': State3(self),
-            'State4': State4(self),
-            'State5': State5(self)
+            'State4': station_base.State4(self),
+            'State5': station_base.State5(self)
         }
 
-    def run(self):
-        while self.current_state not in ['State5']:
-            state = self.states[self.current_state]
-            state.run()  # Run the current state
-
-class State:
-    def __init__(self, machine):
-        self.machine = machine
-
-    def run(self):
-        raise NotImplementedError("State must implement 'run' method.")
-
-class State0(State):
-    def run(self):
-        logger.info("Initializing RFID reader...")
-        
-        self.machine.reader = nfc_reader.NFCReader(logger=logger) 
-        init_successful = False
-        try:
-            self.machine.reader.config()
-            init_successful = True  # Set to True if no exception occurs
-        except Exception as e:
-            logger.error(f"Error initializing reader: {e}")
-            init_successful = False
-
-        if init_successful:
-            logger.info("RFID reader initialized successfully.")
-            self.machine.current_state = 'State1'  # Transition to State1
-        else:
-            logger.error("Failed to initialize RFID reader.")
-            self.machine.current_state = 'State5'  # Transition to State5
-
-
-class State1(State): 
-    def run(self):
-        logger.info("Waiting for RFID card...")
-        
-        # Zugriff auf den Reader
-        reader = self.machine.reader
-        if reader is None:
-            logger.error("No RFID reader available!")
-            self.machine.current_state = 'State5'  # Transition to State5
-            return
-        
-        # Simulate card detection (replace with actual detection code)
-        while True:
-            self.machine.uid = reader.read_passive_target(timeout=0.5)
-            print(".", end="")
-            if self.machine.uid is None:
-                continue
-            logger.info("Found card with UID: %s", [hex(i) for i in self.machine.uid])
-            break
-        
-        if self.machine.uid is None:
-            logger.warning("No card detected. Retrying...")
-            self.machine.current_state = 'State1'  # Wait again
-        else:
-            logger.info(f"Found card with UID: {[hex(i) for i in self.machine.uid]}") 
-            self.machine.current_state = 'State2'  # Transition to State2
-
-
-class State2(State):
-    def run(self):
-        logger.info("Reading Bottle ID from card...")
-
-        # Zugriff auf den Reader und die UID
-        reader = self.machine.reader
-        uid = self.machine.uid
+    def prefetch(self, event):
+        """Encode the QR code of an announced bottle ahead of time."""
+        # Rezept und Tagged_Date kommen mit dem Event, nur der QR-Code muss vorab kodiert werden
+        qr = build_qr(event['rezept_id'], event['flaschen_id'], event['tagged_date'])
+        self.prefetched.put(event['flaschen_id'], (event['rezept_id'], event['tagged_date'], qr))
+        logger.debug(f"Prefetched QR code for Flaschen_ID {event['flaschen_id']}.")
 
-        if reader is None or uid is None:
-            logger.error("No reader or card UID available!")
-            self.machine.current_state = 'State1'  # Zurück zu State1, um auf eine neue Karte zu warten
-            return
-
-        # Blocknummer für das Auslesen festlegen
-        block_number = 2  # Zweiter Block des NFC-Tags, wo die Bottle ID gespeichert ist
-
-        # Versuche, den Block auszulesen
-        try:
-            block_data = reader.read_block(uid, block_number)
-
-            if block_data is None:
-                logger.error("Failed to read from card.")
-                self.machine.current_state = 'State1'  # Zurück zu State1
-                return
-
-            # Extrahiere die Flaschen-ID aus den Daten (erster Byte des Blocks)
-            self.machine.flaschen_id = block_data[0]
-            logger.info(f"Successfully read Bottle ID {self.machine.flaschen_id} from card.")
-
-            # Übergang zu State3
-            self.machine.current_state = 'State3'
-        except Exception as e:
-            logger.error(f"Error reading from card: {e}")
-            self.machine.current_state = 'State1'  # Zurück zu State1
-
-
-
-class State3(State):
+class State3(station_base.State):
     def run(self):
         logger.info("Processing Bottle ID and retrieving data...")
 
-        # Datenbankpfad
-        db_path = "../data/flaschen_database.db"
-
         try:
-            conn = sqlite3.connect(db_path)
-            cursor = conn.cursor()
-
-            # 1. Suche Rezept_ID und Tagged_Date für die Flaschen_ID
-            query = """
-            SELECT Rezept_ID, Tagged_Date
-            FROM Flasche
-            WHERE Flaschen_ID = ?;
-            """
-            cursor.execute(query, (self.machine.flaschen_id,))
-            result = cursor.fetchone()
-
-            if result is None:
-                logger.error(f"No data found for Flaschen_ID {self.machine.flaschen_id}.")
-                self.machine.current_state = 'State5'  # Übergang zu einem Fehlerzustand
-                conn.close()
-                return
-
-            rezept_id, tagged_date = result
-            logger.info(f"Found Rezept_ID {rezept_id} and Tagged_Date {tagged_date} for Flaschen_ID {self.machine.flaschen_id}.")
-            conn.close()
-
-            # QR-Message erstellen
-            qr_message = f"Rezept_ID: {rezept_id}, Flaschen_ID: {self.machine.flaschen_id}, Tagged_Date: {tagged_date}"
-
-            # QRCode-Objekt erstellen
-            qr = qrcode.QRCode(
-                version=1,  # Größe des QR-Codes (1 = kleinste Größe)
-                error_correction=qrcode.constants.ERROR_CORRECT_L,  # Fehlerkorrekturstufe
-                box_size=10,  # Größe der einzelnen Boxen im QR-Code
-                border=4,  # Breite des Randes
-            )
-
-            # Daten hinzufügen
-            qr.add_data(qr_message)
-            qr.make(fit=True)
-
-            # QR-Code-Image erstellen
-            img = qr.make_image(fill="black", back_color="white")
-            qr_path = os.path.expanduser(f"~/MaFa_P5.1/src/QR_CODES/qrcode_{self.machine.flaschen_id}.png")
-
-            # Bild speichern
-            img.save(qr_path)
+            # 0. Von Station 1 angekündigt? Dann ist der QR-Code schon kodiert
+            prefetched = self.machine.prefetched.pop(self.machine.flaschen_id)
+            if prefetched is not None:
+                rezept_id, tagged_date, qr = prefetched
+                logger.info(f"Using prefetched QR code for Flaschen_ID {self.machine.flaschen_id}.")
+            else:
+                # 1. Suche Rezept_ID und Tagged_Date für die Flaschen_ID
+                query = """
+                SELECT Rezept_ID, Tagged_Date
+                FROM Flasche
+                WHERE Flaschen_ID = ?;
+                """
+                result = self.machine.db.fetchone(query, (self.machine.flaschen_id,))
+
+                if result is None:
+                    logger.error(f"No data found for Flaschen_ID {self.machine.flaschen_id}.")
+                    self.machine.current_state = 'State5'  # Übergang zu einem Fehlerzustand
+                    return
+
+                rezept_id, tagged_date = result
+                logger.info(f"Found Rezept_ID {rezept_id} and Tagged_Date {tagged_date} for Flaschen_ID {self.machine.flaschen_id}.")
+                qr = build_qr(rezept_id, self.machine.flaschen_id, tagged_date)
+
+            # QR-Code im gewählten Format rendern und speichern
+            qr_path = qr_codes.write(qr, QR_DIR, f"qrcode_{self.machine.flaschen_id}", QR_FORMAT, QR_BOX_SIZE)
             logger.info(f"QR-Code gespeichert unter {qr_path}.")
 
             # Übergang zu einem nächsten Zustand nach erfolgreicher Verarbeitung
@@ -195,20 +88,10 @@ class State3(State):
             logger.error(f"Database error: {e}")
             self.machine.current_state = 'State5'  # Übergang zu einem Fehlerzustand
 
-class State4(State):
-    def run(self):
-        logger.info("Successfully completed the process! Returning to State1.")
-        quit()
-        # Transition back to State1 - probably not hepful while debugging
-        #self.machine.current_state = 'State1'  
-
-class State5(State):
-    def run(self):
-        logger.error("Process failed at some point. Please check the logs.")
-        self.machine.current_state = 'State5'  # End of process
-
 # Main execution
 if __name__ == '__main__':
+    log_setup.setup_logging(LOG_FILE)
     machine = StateMachine()
+    machine.start_prefetch()
     machine.run()
     logger.info("Stopped Execution. Please rerun the program to start again.")
\ No newline at end of file
@@ -0,0 +1,256 @@
+"""
+Gemeinsamer Rahmen der Stations-State-Machines.
+
+StationMachine hält Datenbank, Reader, Metriken und Produktions-Ledger einer
+Station und führt ihre States aus (run, run_state, run_cycle); die Stationen
+liefern nur die States, die sich unterscheiden. State0 (Reader
+initialisieren), State1 (auf Karten warten, bis zu zwei pro Poll), State4
+und State5 sind bei allen Stationen gleich. LookupMachine und ReadBottleId
+sind der gemeinsame Teil von Station 2 und 3: Vorabladen der von Station 1
+angekündigten Flaschen und Auflösen der Karte über ihre UID.
+
+Die States loggen über den Logger der jeweiligen Station (machine.logger).
+"""
+import threading
+import time
+
+import bottle_events
+import database
+import db_writer
+import metrics
+import nfc_reader
+import production_ledger
+
+END_STATES = ('State4', 'State5')
+BOTTLE_BLOCK = 2  # Block des Tags mit der Flaschen-ID (erstes Byte)
+
+UID_QUERY = """
+SELECT Flaschen_ID
+FROM Flasche_UID
+WHERE UID = ?;
+"""
+
+
+class StationMachine:
+    def __init__(self, name, logger, db=None, db_path=database.DB_PATH, writes=False, registry=None, cs_pin=None,
+                 stop_event=None, ledger=None):
+        # db, registry, stop_event und ledger werden vom Line-Controller (main.py) zwischen den Stationen geteilt
+        self.name = name
+        self.logger = logger
+        if db is None:
+            # Läuft der Schreib-Daemon (db_writer.py), schreibt die Station über ihn und liest selbst nur
+            writer = db_writer.running(db_path)
+            db = database.Database(db_path, logger=logger, read_only=writer is not None or not writes, writer=writer)
+        self.db = db
+        self.metrics = registry or metrics.registry
+        self.cs_pin = cs_pin
+        self.stop_event = stop_event or threading.Event()
+        self.reader = None
+        self.uid = None
+        self.flaschen_id = None
+        if ledger is None:
+            # Produktions-Ereignisse brauchen eine schreibende Verbindung, auch bei den Lookup-Stationen
+            ledger_db = self.db if self.db.writable else database.Database(self.db.path, logger=logger)
+            ledger = production_ledger.EventLedger(ledger_db, logger=logger).start()
+        self.ledger = ledger
+        self.cycle_states = []  # (State, Start, Ende, Folge-State) der aktuellen Flasche
+        self.target = 1  # PN532-Target der aktuellen Karte (1 oder 2)
+        self.queued_targets = []  # im selben Poll erkannte weitere Karten: (target, uid)
+        self.current_state = 'State0'
+        self.states = {}
+
+    def run(self):
+        try:
+            while self.current_state not in ['State5']:
+                self.run_state(self.current_state)  # Run the current state
+        finally:
+            # einzeln laufende Station: sonst liest niemand die Histogramme (z.B. MAFA_NFC_TIMING=1); State4 beendet per quit()
+            self.metrics.log_summary(self.logger)
+
+    def run_state(self, name):
+        """Run one state, note it for the production event ledger and return its duration."""
+        wall_start = time.time()
+        start = time.perf_counter()
+        self.states[name].run()
+        duration = time.perf_counter() - start
+        self.cycle_states.append((name, wall_start, wall_start + duration, self.current_state))
+        if self.current_state in END_STATES:
+            # vor State4 melden: State4 beendet die einzeln laufende Station
+            self.ledger.record_cycle(self.name, self.flaschen_id, self.cycle_states)
+            self.cycle_states = []
+        return duration
+
+    def run_cycle(self):
+        """Process one bottle from State1 up to State4 (done) or State5 (failed) without quitting."""
+        self.current_state = 'State1'
+        self.flaschen_id = None
+        self.cycle_states = []  # Reste eines per Stop abgebrochenen Zyklus verwerfen
+        cycle_start = time.perf_counter()
+        while self.current_state not in END_STATES and not self.stop_event.is_set():
+            name = self.current_state
+            self.metrics.observe(f"{self.name}.{name}", self.run_state(name))
+        if self.current_state in END_STATES:  # abgebrochene Zyklen (Stop) nicht zählen
+            self.metrics.observe(f"{self.name}.cycle", time.perf_counter() - cycle_start)
+            self.metrics.incr(f"{self.name}.{self.current_state}")
+        return self.current_state
+
+
+class LookupMachine(StationMachine):
+    """Station 2 and 3: read-only lookups, bottles announced by station1 are preloaded."""
+
+    def __init__(self, name, logger, **options):
+        super().__init__(name, logger, **options)
+        self.prefetched = bottle_events.PrefetchCache()  # von Station 1 angekündigte Flaschen
+        self.uid_map = bottle_events.PrefetchCache()  # Karten-UID -> Flaschen_ID aus den Events
+
+    def start_prefetch(self):
+        """Listen for bottles tagged by station1 and preload their data in the background."""
+        subscriber = bottle_events.Subscriber(self.name, self._on_event, self.stop_event)
+        subscriber.start()
+        return subscriber
+
+    def _on_event(self, event):
+        if event.get('uid'):
+            self.uid_map.put(event['uid'], event['flaschen_id'])
+        self.prefetch(event)
+
+    def prefetch(self, event):
+        """Preload the station's data for an announced bottle into self.prefetched."""
+        raise NotImplementedError
+
+
+class State:
+    def __init__(self, machine):
+        self.machine = machine
+
+    @property
+    def logger(self):
+        return self.machine.logger
+
+    def run(self):
+        raise NotImplementedError("State must implement 'run' method.")
+
+
+class State0(State):
+    def run(self):
+        logger = self.logger
+        logger.info("Initializing RFID reader...")
+
+        self.machine.reader = nfc_reader.NFCReader(
+            logger=logger, cs_pin=self.machine.cs_pin, registry=self.machine.metrics,
+            metrics_prefix=f"{self.machine.name}.pn532"
+        )
+        init_successful = False
+        try:
+            self.machine.reader.config()
+            init_successful = True  # Set to True if no exception occurs
+        except Exception as e:
+            logger.error(f"Error initializing reader: {e}")
+            init_successful = False
+
+        if init_successful:
+            logger.info("RFID reader initialized successfully.")
+            self.machine.current_state = 'State1'  # Transition to State1
+        else:
+            logger.error("Failed to initialize RFID reader.")
+            self.machine.current_state = 'State5'  # Transition to State5
+
+
+class State1(State):
+    def run(self):
+        logger = self.logger
+        logger.info("Waiting for RFID card...")
+
+        # Zugriff auf den Reader
+        reader = self.machine.reader
+        if reader is None:
+            logger.error("No RFID reader available!")
+            self.machine.current_state = 'State5'  # Transition to State5
+            return
+
+        self.machine.uid = None
+        while not self.machine.stop_event.is_set():
+            if self.machine.queued_targets:
+                # Zweite Karte aus dem letzten Poll: bleibt beim PN532 aktiv, kein neuer Poll nötig
+                self.machine.target, self.machine.uid = self.machine.queued_targets.pop(0)
+            else:
+                uids = reader.read_passive_targets(max_targets=nfc_reader.MAX_TARGETS, timeout=0.5)
+                print(".", end="")
+                if not uids:
+                    continue
+                self.machine.target, self.machine.uid = 1, uids[0]
+                self.machine.queued_targets = [(i + 2, uid) for i, uid in enumerate(uids[1:])]
+            logger.info("Found card with UID: %s", [hex(i) for i in self.machine.uid])
+            break
+
+        if self.machine.uid is None:
+            logger.warning("No card detected. Retrying...")
+            self.machine.current_state = 'State1'  # Wait again
+        else:
+            logger.info(f"Found card with UID: {[hex(i) for i in self.machine.uid]}")
+            self.machine.current_state = 'State2'  # Transition to State2
+
+
+class ReadBottleId(State):
+    """State2 of station 2 and 3: Flaschen_ID from the card UID, from block 2 as fallback."""
+
+    def run(self):
+        logger = self.logger
+        logger.info("Reading Bottle ID from card...")
+
+        # Zugriff auf den Reader und die UID
+        reader = self.machine.reader
+        uid = self.machine.uid
+
+        if reader is None or uid is None:
+            logger.error("No reader or card UID available!")
+            self.machine.current_state = 'State1'  # Zurück zu State1, um auf eine neue Karte zu warten
+            return
+
+        # Flasche über die Karten-UID auflösen (von Station 1 gespeichert) – spart Authentifizierung und Block-Read
+        uid_key = database.uid_hex(uid)
+        flaschen_id = self.machine.uid_map.pop(uid_key)
+        if flaschen_id is None:
+            try:
+                result = self.machine.db.fetchone(UID_QUERY, (uid_key,))
+                flaschen_id = result[0] if result else None
+            except Exception as e:
+                logger.warning(f"UID lookup failed, reading the card instead: {e}")
+        if flaschen_id is not None:
+            self.machine.flaschen_id = flaschen_id
+            logger.info(f"Resolved Bottle ID {flaschen_id} from card UID.")
+            self.machine.current_state = 'State3'
+            return
+
+        # Fallback: UID unbekannt, Bottle ID vom Tag lesen
+        try:
+            block_data = reader.read_block(uid, BOTTLE_BLOCK, target=self.machine.target)
+
+            if block_data is None:
+                logger.error("Failed to read from card.")
+                self.machine.current_state = 'State1'  # Zurück zu State1
+                return
+
+            # Extrahiere die Flaschen-ID aus den Daten (erster Byte des Blocks)
+            self.machine.flaschen_id = block_data[0]
+            logger.info(f"Successfully read Bottle ID {self.machine.flaschen_id} from card.")
+
+            # Übergang zu State3
+            self.machine.current_state = 'State3'
+        except Exception as e:
+            logger.error(f"Error reading from card: {e}")
+            self.machine.current_state = 'State1'  # Zurück zu State1
+
+
+class State4(State):
+    def run(self):
+        self.logger.info("Successfully completed the process! Returning to State1.")
+        quit()
+        # Transition back to State1 - probably not hepful while debugging
+        #self.machine.current_state = 'State1'
+
+
+class State5(State):
+    def run(self):
+        self.logger.error("Process failed at some point. Please check the logs.")
+        self.machine.current_state = 'State5'  # End of process
@@ -0,0 +1,125 @@
+"""
+Preloaded station daemon and thin trigger client.
+
+The daemon imports a station module together with its deferred dependencies,
+initializes the RFID reader (State0) and warms up the database once. It then
+waits on a Unix socket; every "cycle" request processes one bottle, so the
+first cycle after launch costs the same as every following one.
+
+    python station_daemon.py serve station1
+    python station_daemon.py trigger station1
+    python station_daemon.py stats station1
+
+The client side only needs socket and json, so triggering a cycle is cheap.
+"""
+import json
+import socket
+import sys
+
+SOCKET_TEMPLATE = "/tmp/mafa_{station}.sock"
+STATIONS = ('station1', 'station2', 'station3')
+
+
+def socket_path(station):
+    return SOCKET_TEMPLATE.format(station=station)
+
+
+def preload(station):
+    """Import the station with all deferred modules and bring it into steady state."""
+    import importlib
+    import time
+
+    start = time.perf_counter()
+    module = importlib.import_module(station)
+    for name in module.PRELOAD_MODULES:
+        importlib.import_module(name)
+
+    machine = module.StateMachine()
+    if station == 'station1':  # nur Station 1 schreibt Flaschen; mit Schreib-Daemon ist ihre Verbindung read-only
+        machine.db.enable_journal()
+    if hasattr(machine, 'start_prefetch'):
+        machine.start_prefetch()
+    machine.states['State0'].run()
+    if machine.current_state == 'State5':
+        raise RuntimeError(f"{station}: reader initialization failed")
+
+    # Erste Verbindung öffnet die Datei und lädt das Schema – das soll nicht der erste Zyklus bezahlen
+    machine.db.fetchone("SELECT Flaschen_ID FROM Flasche LIMIT 1")
+
+    module.logger.info(f"{station} preloaded in {(time.perf_counter() - start) * 1000:.1f} ms")
+    return module, machine
+
+
+def serve(station, path=None):
+    import importlib
+    import os
+    import socketserver
+    import time
+
+    import log_setup
+
+    log_setup.setup_logging(importlib.import_module(station).LOG_FILE)
+    module, machine = preload(station)
+    path = path or socket_path(station)
+    if os.path.exists(path):
+        os.remove(path)
+
+    class CycleHandler(socketserver.StreamRequestHandler):
+        def handle(self):
+            command = self.rfile.readline().decode('utf-8').strip()
+            if command == 'ping':
+                reply = {'station': station, 'status': 'ready'}
+            elif command == 'cycle':
+                start = time.perf_counter()
+                end_state = machine.run_cycle()
+                reply = {
+                    'station': station,
+                    'state': end_state,
+                    'ok': end_state == 'State4',
+                    'flaschen_id': getattr(machine, 'flaschen_id', None),
+                    'duration_ms': (time.perf_counter() - start) * 1000,
+                }
+            elif command == 'stats':
+                # Zykluszeiten und, mit MAFA_NFC_TIMING=1, die PN532-Kommandos seit dem Start
+                reply = {'station': station, **machine.metrics.snapshot()}
+            else:
+                reply = {'station': station, 'error': f"unknown command {command!r}"}
+            self.wfile.write((json.dumps(reply) + '\n').encode('utf-8'))
+
+    # Ein Reader pro Station: Anfragen werden nacheinander abgearbeitet
+    with socketserver.UnixStreamServer(path, CycleHandler) as server:
+        module.logger.info(f"{station} daemon listening on {path}")
+        try:
+            server.serve_forever()
+        finally:
+            os.remove(path)
+            machine.metrics.log_summary(module.logger)
+
+
+def trigger(station, command='cycle', path=None, timeout=None):
+    """Send one command to a running daemon and return its JSON reply."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.settimeout(timeout)
+        client.connect(path or socket_path(station))
+        client.sendall((command + '\n').encode('utf-8'))
+        with client.makefile('rb') as reply:
+            return json.loads(reply.readline())
+
+
+def main(argv):
+    if len(argv) < 2 or argv[0] not in ('serve', 'trigger', 'ping', 'stats') or argv[1] not in STATIONS:
+        print(f"usage: station_daemon.py serve|trigger|ping|stats {'|'.join(STATIONS)} [socket]")
+        return 2
+    action, station = argv[0], argv[1]
+    path = argv[2] if len(argv) > 2 else None
+    if action == 'serve':
+        serve(station, path)
+        return 0
+
+    reply = trigger(station, 'cycle' if action == 'trigger' else action, path)
+    print(json.dumps(reply))
+    return 0 if reply.get('ok', action != 'trigger') else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
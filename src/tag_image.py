@@ -0,0 +1,49 @@
+"""
+Abbild eines MiFare-Classic-1K-Tags als ein bytes-Objekt (64 Blöcke à 16 Byte).
+
+Beim Aufbereiten zurückgegebener Flaschen wird der Tag nicht mehr blind neu
+beschrieben: diff() vergleicht das gewünschte mit dem gelesenen Abbild und
+liefert nur die geänderten Datenblöcke, gruppiert nach Sektor, damit je
+Sektor nur einmal authentifiziert wird. Block 0 (Hersteller, schreibgeschützt)
+und die Sektor-Trailer (Schlüssel/Zugriffsbits) werden nie geschrieben.
+"""
+BLOCK_SIZE = 16
+BLOCK_COUNT = 64
+BLOCKS_PER_SECTOR = 4
+IMAGE_SIZE = BLOCK_SIZE * BLOCK_COUNT
+
+
+def sector_of(block_number):
+    return block_number // BLOCKS_PER_SECTOR
+
+
+def is_trailer(block_number):
+    return block_number % BLOCKS_PER_SECTOR == BLOCKS_PER_SECTOR - 1
+
+
+def is_writable(block_number):
+    return block_number != 0 and not is_trailer(block_number)
+
+
+def from_blocks(blocks):
+    """Join 64 blocks (as returned block by block from the reader) into one image."""
+    image = b''.join(bytes(block) for block in blocks)
+    if len(image) != IMAGE_SIZE:
+        raise ValueError(f"Tag image has {len(image)} bytes, expected {IMAGE_SIZE}")
+    return image
+
+
+def block(image, block_number):
+    start = block_number * BLOCK_SIZE
+    return image[start:start + BLOCK_SIZE]
+
+
+def diff(current, desired):
+    """{sector: [block numbers]} of writable blocks whose content differs, in block order."""
+    if len(current) != IMAGE_SIZE or len(desired) != IMAGE_SIZE:
+        raise ValueError(f"Tag images must be {IMAGE_SIZE} bytes")
+    changes = {}
+    for block_number in range(BLOCK_COUNT):
+        if is_writable(block_number) and block(current, block_number) != block(desired, block_number):
+            changes.setdefault(sector_of(block_number), []).append(block_number)
+    return changes
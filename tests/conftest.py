@@ -0,0 +1,26 @@
+import os
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+BASE_SCHEMA = [
+    "CREATE TABLE Flasche (Flaschen_ID INTEGER PRIMARY KEY, Rezept_ID INTEGER, Tagged_Date DATE, has_error BOOLEAN)",
+    "CREATE TABLE Rezept (Rezept_ID INTEGER PRIMARY KEY, Stueckzahl INTEGER)",
+    "CREATE TABLE Rezept_besteht_aus_Granulat (Rezept_ID INTEGER, Granulat_ID INTEGER, Menge FLOAT)",
+    "CREATE TABLE Fill_Level (Dispenser_ID INTEGER, Fill_Level INTEGER, Time TIMESTAMP, PRIMARY KEY (Dispenser_ID, Time))",
+]
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    """Empty station database with the original tables (like data/flaschen_database.db)."""
+    path = str(tmp_path / 'flaschen_database.db')
+    conn = sqlite3.connect(path)
+    for statement in BASE_SCHEMA:
+        conn.execute(statement)
+    conn.commit()
+    conn.close()
+    return path
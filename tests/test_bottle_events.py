@@ -0,0 +1,50 @@
+import json
+import logging
+import queue
+import socket
+import threading
+
+import bottle_events
+
+
+def send(path, event):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sender:
+        sender.sendto(json.dumps(event).encode('utf-8'), path)
+
+
+def test_second_subscriber_keeps_off_a_live_socket(tmp_path, caplog):
+    path = str(tmp_path / 'events.sock')
+    stop_event = threading.Event()
+    received = queue.Queue()
+    first = bottle_events.Subscriber('station2', received.put, stop_event, path=path)
+    first.start()
+
+    with caplog.at_level(logging.WARNING, logger='bottle_events'):
+        second = bottle_events.Subscriber('station2', received.put, stop_event, path=path)
+        second.start()
+    second.join(1)
+
+    assert 'already in use' in caplog.text
+    send(path, {'flaschen_id': 27})
+    assert received.get(timeout=2) == {'flaschen_id': 27}
+    stop_event.set()
+    first.join(2)
+
+
+def test_stale_socket_file_is_replaced(tmp_path, caplog):
+    path = str(tmp_path / 'events.sock')
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    stale.bind(path)
+    stale.close()  # Datei bleibt liegen, niemand lauscht
+
+    stop_event = threading.Event()
+    received = queue.Queue()
+    with caplog.at_level(logging.WARNING, logger='bottle_events'):
+        subscriber = bottle_events.Subscriber('station3', received.put, stop_event, path=path)
+    subscriber.start()
+
+    assert 'already in use' not in caplog.text
+    send(path, {'flaschen_id': 28})
+    assert received.get(timeout=2) == {'flaschen_id': 28}
+    stop_event.set()
+    subscriber.join(2)
@@ -0,0 +1,51 @@
+import json
+import sqlite3
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+import bottle_trace
+import database
+
+
+@pytest.fixture
+def service(db_path):
+    conn = sqlite3.connect(db_path)
+    conn.execute("INSERT INTO Rezept VALUES (1, 10)")
+    conn.execute("INSERT INTO Flasche VALUES (27, 1, '2024-12-04 10:00:00', 0)")
+    conn.commit()
+    conn.close()
+    database.Database(db_path).close()  # legt Flasche_UID & Co. an (database.SCHEMA)
+
+    tracer = bottle_trace.BottleTrace(database.Database(db_path, read_only=True))
+    server = bottle_trace.make_server(tracer, port=0)
+    threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True).start()
+    yield tracer, f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def get(url):
+    try:
+        with urllib.request.urlopen(url) as response:
+            return response.status, json.load(response)
+    except urllib.error.HTTPError as e:
+        return e.code, json.load(e)
+
+
+@pytest.mark.parametrize('key, status', [
+    ('27', 200), ('28', 404), ('uid:04a1b2c3', 404),
+    ('uid:zz', 400), ('uid:', 400), ('abc', 400), ('99999999999999999999', 400),
+])
+def test_status_codes(service, key, status):
+    _, url = service
+    assert get(f"{url}/trace/{key}")[0] == status
+
+
+def test_unexpected_error_is_json_500(service, monkeypatch):
+    tracer, url = service
+    monkeypatch.setattr(tracer.db, 'fetchone', lambda *args: 1 / 0)
+    status, body = get(f"{url}/trace/31")
+    assert status == 500 and 'ZeroDivisionError' in body['error']
@@ -0,0 +1,85 @@
+import json
+import sqlite3
+import time
+
+import database
+import db_journal
+
+
+def tagged(db_path):
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute("SELECT Flaschen_ID, Tagged_Date FROM Flasche ORDER BY Flaschen_ID").fetchall()
+    conn.close()
+    return rows
+
+
+def insert_bottles(db_path, count):
+    conn = sqlite3.connect(db_path)
+    conn.executemany("INSERT INTO Flasche VALUES (?, 1, 0, 0)", [(i,) for i in range(1, count + 1)])
+    conn.commit()
+    conn.close()
+
+
+def test_legacy_station1_journal_is_moved(db_path):
+    insert_bottles(db_path, 3)
+    db = database.Database(db_path)
+    # Altes Journal: Eintrag 1 ist schon angewendet, 2 und 3 stehen noch aus
+    db.execute("INSERT INTO Journal_State (Journal, Applied_Seq) VALUES (?, 1)",
+               ("flaschen_database.db.station1.writebehind",))
+    db.execute("INSERT INTO Journal_State (Journal, Applied_Seq) VALUES ('flaschen_database.db.writebehind', 7)")
+    with open(db_path + '.station1.writebehind', 'w', encoding='utf-8') as f:
+        for seq in (1, 2, 3):
+            statement = ["UPDATE Flasche SET Tagged_Date = Tagged_Date + 1 WHERE Flaschen_ID = ?", [seq]]
+            f.write(json.dumps({'seq': seq, 'statements': [statement]}) + '\n')
+
+    journal = db.enable_journal()
+    assert journal.path == db_path + database.JOURNAL_SUFFIX
+    assert [entry['seq'] for entry in journal.pending] == [8, 9]
+    db.close()
+    assert tagged(db_path) == [(1, 0), (2, 1), (3, 1)]
+
+
+def test_start_does_not_block_on_locked_database(db_path):
+    insert_bottles(db_path, 1)
+    db = database.Database(db_path)
+    db.enable_journal().stop()
+    with open(db_path + database.JOURNAL_SUFFIX, 'w', encoding='utf-8') as f:
+        statement = ["UPDATE Flasche SET Tagged_Date = '2024-12-04 10:00:00' WHERE Flaschen_ID = 1", []]
+        f.write(json.dumps({'seq': 1, 'statements': [statement]}) + '\n')
+    db.close()
+
+    db = database.Database(db_path)
+    db.connection().execute("PRAGMA busy_timeout = 0")
+    blocker = sqlite3.connect(db_path)
+    blocker.execute("BEGIN IMMEDIATE")
+    journal = db.enable_journal(flush_interval=0.05)  # Nachspielen scheitert zunächst, wirft aber nicht
+    assert journal.pending
+    blocker.rollback()
+    blocker.close()
+    deadline = time.monotonic() + 10
+    while journal.pending and time.monotonic() < deadline:
+        time.sleep(0.05)
+    db.close()
+    assert tagged(db_path) == [(1, '2024-12-04 10:00:00')]
+
+
+def test_entry_after_torn_line_survives_restart(db_path):
+    insert_bottles(db_path, 2)
+    statement = ["UPDATE Flasche SET Tagged_Date = Tagged_Date + 1 WHERE Flaschen_ID = ?", [1]]
+    with open(db_path + database.JOURNAL_SUFFIX, 'w', encoding='utf-8') as f:
+        f.write(json.dumps({'seq': 1, 'statements': [statement]}) + '\n')
+        f.write('{"seq": 2, "statem')  # Stromausfall mitten im append
+
+    db = database.Database(db_path)
+    # Ohne Flusher: der Prozess stürzt nach dem bestätigten append ab
+    journal = db_journal.WriteBehindJournal(db, db_path + database.JOURNAL_SUFFIX)
+    journal.append("UPDATE Flasche SET Tagged_Date = Tagged_Date + 1 WHERE Flaschen_ID = ?", (2,))
+    journal._file.close()
+    db.close()
+
+    with open(db_path + database.JOURNAL_SUFFIX, encoding='utf-8') as f:
+        assert [json.loads(line)['seq'] for line in f] == [1, 2]
+    db = database.Database(db_path)
+    db.enable_journal()
+    db.close()
+    assert tagged(db_path) == [(1, 1), (2, 1)]
@@ -0,0 +1,84 @@
+import json
+import socket
+import sqlite3
+import threading
+import time
+
+import pytest
+
+import database
+import db_writer
+import production_ledger
+
+
+def request(request_id, client, tagged):
+    return {'id': request_id, 'client': client,
+            'statements': [["UPDATE Flasche SET Tagged_Date = Tagged_Date + ? WHERE Flaschen_ID = 1", [tagged]]]}
+
+
+def test_resent_request_is_applied_once(db_path, tmp_path):
+    conn = sqlite3.connect(db_path)
+    conn.execute("INSERT INTO Flasche VALUES (1, 1, 0, 0)")
+    conn.commit()
+    conn.close()
+
+    replies = []
+    daemon = db_writer.WriterDaemon(db_path, str(tmp_path / 'w.sock'))
+    daemon._apply([(request(1, 'a', 1), replies.append), (request(2, 'a', 10), replies.append)])
+    # Bestätigung verloren: der Client sendet nach dem Neuaufbau 2 erneut, dazu eine neue Anfrage
+    daemon._apply([(request(2, 'a', 10), replies.append), (request(3, 'a', 100), replies.append)])
+    daemon.db.close()
+    # Auch nach einem Neustart des Daemons
+    daemon = db_writer.WriterDaemon(db_path, str(tmp_path / 'w.sock'))
+    daemon._apply([(request(3, 'a', 100), replies.append), (request(1, 'b', 1000), replies.append)])
+    daemon.db.close()
+
+    assert [reply.get('duplicate', False) for reply in replies] == [False, False, True, False, True, False]
+    assert all(reply['ok'] for reply in replies)
+    conn = sqlite3.connect(db_path)
+    assert conn.execute("SELECT Tagged_Date FROM Flasche").fetchone() == (1111,)
+    assert dict(conn.execute("SELECT Client, Applied_ID FROM Writer_Client")) == {'a': 3, 'b': 1}
+    conn.close()
+
+
+def drop_after_request(socket_path, db_path):
+    """Fake daemon: answers the hello, reads one request and closes the connection without an ack."""
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(socket_path)
+    server.listen()
+
+    def serve():
+        conn, _ = server.accept()
+        reader = conn.makefile('rb')
+        hello = json.loads(reader.readline())
+        conn.sendall(json.dumps({'id': hello['id'], 'ok': True, 'db': db_path}).encode('utf-8') + b'\n')
+        reader.readline()
+        conn.close()
+        server.close()
+
+    threading.Thread(target=serve, daemon=True).start()
+
+
+def test_connection_lost_before_ack(db_path, tmp_path):
+    socket_path = str(tmp_path / 'w.sock')
+    drop_after_request(socket_path, db_path)
+    client = db_writer.WriterClient(db_path, socket_path, ack_timeout=10)
+
+    start = time.monotonic()
+    with pytest.raises(db_writer.AckLostError):
+        client.execute("INSERT INTO Rezept VALUES (1, 10)")
+    assert time.monotonic() - start < 1  # nicht erst nach ack_timeout
+    assert not client._pending  # wird beim nächsten Verbindungsaufbau nicht erneut gesendet
+    client.close()
+
+
+def test_ledger_does_not_reinsert_possibly_applied_events(db_path, tmp_path):
+    socket_path = str(tmp_path / 'w.sock')
+    drop_after_request(socket_path, db_path)
+    db = database.Database(db_path, read_only=True, writer=socket_path)
+    ledger = production_ledger.EventLedger(db)
+    ledger.record_cycle('station1', 1, [('State1', 0.0, 1.0, 'State4')])
+
+    assert ledger.flush() == 0
+    assert ledger._buffer == []
+    db.close()
@@ -0,0 +1,74 @@
+import os
+
+import pytest
+
+import database
+import export_history
+
+
+@pytest.fixture
+def db(db_path):
+    writer = database.Database(db_path)
+    writer.execute_batch([
+        ("INSERT INTO Rezept VALUES (1, 15)", ()),
+        ("INSERT INTO Rezept_besteht_aus_Granulat VALUES (1, 3, 10.0)", ()),
+        ("INSERT INTO Flasche VALUES (1, 1, '2024-12-04 10:00:00', 0)", ()),
+        ("INSERT INTO Flasche VALUES (2, 1, '2024-12-04 10:00:30', 1)", ()),
+        ("INSERT INTO Flasche VALUES (3, 1, 0, 0)", ()),
+        ("INSERT INTO Fill_Level VALUES (1, 80, '2024-12-04 10:00:00')", ()),
+    ])
+    writer.close()
+    reader = database.Database(db_path, read_only=True)
+    yield reader
+    reader.close()
+
+
+def test_parquet_round_trip(db, tmp_path):
+    parquet = pytest.importorskip('pyarrow.parquet')
+    run_dir, counts = export_history.export(db, str(tmp_path / 'out'), 'parquet')
+
+    assert counts['Flasche'] == 2  # ungetaggte Flasche 3 wird nicht exportiert
+    table = parquet.read_table(os.path.join(run_dir, 'Flasche.parquet'))
+    assert table.to_pylist() == [
+        {'Flaschen_ID': 1, 'Rezept_ID': 1, 'Tagged_Date': '2024-12-04 10:00:00', 'has_error': False},
+        {'Flaschen_ID': 2, 'Rezept_ID': 1, 'Tagged_Date': '2024-12-04 10:00:30', 'has_error': True},
+    ]
+    fill_levels = parquet.read_table(os.path.join(run_dir, 'Fill_Level.parquet')).to_pylist()
+    assert fill_levels == [{'Dispenser_ID': 1, 'Fill_Level': 80, 'Time': '2024-12-04 10:00:00'}]
+
+
+def test_incremental_csv_export_after_watermark(db, tmp_path):
+    out = str(tmp_path / 'out')
+    export_history.export(db, out, 'csv')
+    run_dir, counts = export_history.export(db, out, 'csv')
+
+    assert counts['Flasche'] == 0 and counts['Fill_Level'] == 0
+    assert counts['Rezept'] == 1  # kleine Tabellen immer vollständig
+    assert os.path.exists(os.path.join(run_dir, 'Flasche.csv'))
+
+
+def test_exports_in_the_same_second_get_separate_directories(db, tmp_path):
+    out = str(tmp_path / 'out')
+    first, _ = export_history.export(db, out, 'csv', full=True)
+    second, _ = export_history.export(db, out, 'csv', full=True)
+
+    assert first != second
+    assert os.path.isdir(first) and os.path.isdir(second)
+
+
+def test_late_applied_rows_behind_the_lag_are_not_lost(db_path, tmp_path):
+    out = str(tmp_path / 'out')
+    writer = database.Database(db_path)
+    writer.execute("INSERT INTO Flasche VALUES (4, 1, datetime('now', '-30 seconds'), 0)")
+    db = database.Database(db_path, read_only=True)
+    _, counts = export_history.export(db, out, 'csv', lag=120)
+    assert counts['Flasche'] == 0  # jünger als der Abstand
+
+    # Früher getaggt, aber erst jetzt aus dem Journal angewendet
+    writer.execute("INSERT INTO Flasche VALUES (5, 1, datetime('now', '-60 seconds'), 0)")
+    run_dir, counts = export_history.export(db, out, 'csv', lag=0)
+    assert counts['Flasche'] == 2
+    with open(os.path.join(run_dir, 'Flasche.csv'), encoding='utf-8') as f:
+        assert [line.split(',')[0] for line in f.read().splitlines()[1:]] == ['5', '4']
+    writer.close()
+    db.close()
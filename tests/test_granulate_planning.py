@@ -0,0 +1,69 @@
+import json
+import sqlite3
+
+import numpy as np
+import pytest
+
+import granulate_planning
+
+
+def test_empty_database_plans_nothing(db_path, capsys):
+    assert granulate_planning.main(['--db', db_path, '--json']) == 0
+    result = json.loads(capsys.readouterr().out)
+    assert result['bottles'] == 0 and result['dispensers'] == []
+
+
+def test_order_without_recipes_counts_unknown_bottles(db_path, capsys):
+    assert granulate_planning.main(['--db', db_path, '--json', '--order', '1=3']) == 0
+    result = json.loads(capsys.readouterr().out)
+    assert result['bottles'] == 3 and result['unknown_recipe_bottles'] == 3 and result['producible'] == 3
+
+
+@pytest.fixture
+def plant(db_path):
+    conn = sqlite3.connect(db_path)
+    conn.executemany("INSERT INTO Rezept_besteht_aus_Granulat VALUES (?, ?, ?)", [
+        (1, 1, 10.0), (1, 2, 5.0),
+        (3, 3, 42.0), (3, 3, 18.0),  # Granulat 3 zweimal in Rezept 3
+    ])
+    conn.executemany("INSERT INTO Flasche VALUES (?, ?, 0, 0)", [(10, 3), (11, 1), (12, 3), (13, 3), (14, 1)])
+    conn.execute("INSERT INTO Flasche VALUES (9, 3, '2024-12-04 10:00:00', 0)")  # schon getaggt
+    conn.executemany("INSERT INTO Fill_Level VALUES (?, ?, ?)", [
+        (1, 90, '2024-12-04 09:00:00'), (1, 50, '2024-12-04 10:00:00'),  # nur der letzte Stand zählt
+        (2, 100, '2024-12-04 10:00:00'), (3, 10, '2024-12-04 10:00:00'),
+    ])
+    conn.commit()
+    conn.close()
+    return db_path
+
+
+def test_duplicate_granulate_rows_are_summed():
+    recipes = granulate_planning.RecipeMatrix([(1, 1, 10.0), (1, 2, 5.0), (3, 3, 42.0), (3, 3, 18.0)])
+    demand, unknown = recipes.demand(np.array([3, 1, 2]))
+    assert demand.tolist() == [[0.0, 0.0, 60.0], [10.0, 5.0, 0.0], [0.0, 0.0, 0.0]]
+    assert unknown == 1
+
+
+def test_plan_against_fill_levels(plant, capsys):
+    assert granulate_planning.main(['--db', plant, '--json']) == 0
+    result = json.loads(capsys.readouterr().out)
+
+    assert result['bottles'] == 5
+    assert result['producible'] == 2  # Granulat 3: 100 verfügbar, je Flasche 60
+    assert result['first_blocked_flaschen_id'] == 12
+    dispensers = {entry['dispenser_id']: entry for entry in result['dispensers']}
+    assert dispensers[1]['available'] == 500.0 and dispensers[1]['demand'] == 20.0
+    assert dispensers[1]['bottles_until_empty'] == 5 and dispensers[1]['empty_at_flaschen_id'] is None
+    assert dispensers[3]['demand'] == 180.0 and dispensers[3]['remaining'] == -80.0
+    assert dispensers[3]['bottles_until_empty'] == 2 and dispensers[3]['empty_at_flaschen_id'] == 12
+
+
+def test_order_reports_positions(plant, capsys):
+    assert granulate_planning.main(['--db', plant, '--json', '--order', '3=2', '1=1']) == 0
+    result = json.loads(capsys.readouterr().out)
+
+    assert 'first_blocked_flaschen_id' not in result
+    assert result['first_blocked_position'] == 2  # zweite Flasche von Rezept 3 braucht 120 > 100
+    assert {entry['dispenser_id']: entry['empty_at_position'] for entry in result['dispensers']}[3] == 2
+    granulate_planning.print_plan(result)
+    assert 'position 2' in capsys.readouterr().out
@@ -0,0 +1,170 @@
+import logging
+import threading
+import time
+
+import pytest
+
+import nfc_reader
+import tag_image
+
+
+class FakeSPIDevice:
+    """SPIDevice stand-in on a shared fake bus; records overlapping transfers."""
+
+    def __init__(self, bus, ready=False):
+        self.bus = bus
+        self.ready = ready
+
+    def __enter__(self):
+        self.bus['active'] += 1
+        self.bus['overlaps'] += self.bus['active'] > 1
+        return self
+
+    def __exit__(self, *exc_info):
+        self.bus['active'] -= 1
+
+    def write_readinto(self, out_buffer, in_buffer):
+        time.sleep(0.001)
+        in_buffer[1] = nfc_reader._reverse_bit(0x01 if self.ready else 0x00)
+
+    def write(self, data):
+        time.sleep(0.001)
+
+
+def test_pending_poll_does_not_block_other_reader():
+    bus = {'active': 0, 'overlaps': 0}
+    polling = nfc_reader._LockedSPIDevice(FakeSPIDevice(bus))  # leeres Feld: nie bereit
+    other = nfc_reader._LockedSPIDevice(FakeSPIDevice(bus, ready=True))
+
+    poll = threading.Thread(target=nfc_reader._wait_ready, args=(polling, 0.5))
+    poll.start()
+    time.sleep(0.05)
+    start = time.monotonic()
+    for _ in range(5):
+        with other as spi:
+            spi.write(b'\x01')
+        assert nfc_reader._wait_ready(other, 0.5)
+    elapsed = time.monotonic() - start
+    poll.join()
+
+    assert elapsed < 0.2  # ein Kommando-Lock hätte bis zum Ende des Polls (0.5 s) gewartet
+    assert bus['overlaps'] == 0
+
+
+def test_locked_device_forwards_settings():
+    device = FakeSPIDevice({'active': 0, 'overlaps': 0})
+    locked = nfc_reader._LockedSPIDevice(device)
+    locked.baudrate = 400000
+    assert device.baudrate == 400000 and locked.baudrate == 400000
+
+
+class StubPN532:
+    """PN532_SPI stand-in: call_function answers from a queue and records the frames."""
+
+    def __init__(self, responses=()):
+        self.responses = list(responses)
+        self.calls = []
+
+    def call_function(self, command, response_length=0, params=b'', timeout=1):
+        self.calls.append((command, bytes(params), response_length))
+        return self.responses.pop(0) if self.responses else None
+
+
+def make_reader(pn532):
+    reader = nfc_reader.NFCReader.__new__(nfc_reader.NFCReader)  # ohne config(): keine Hardware
+    reader.__dict__.update(logger=logging.getLogger('test'), cs_pin='D8', _pn532=pn532)
+    return reader
+
+
+UID4 = bytes([0x04, 0xA1, 0xB2, 0xC3])
+UID7 = bytes([0x04, 0x11, 0x22, 0x33, 0x44, 0x55, 0x66])
+
+
+def target(tg, uid, sel_res=0x08, ats=b''):
+    return bytes([tg, 0x00, 0x04, sel_res, len(uid)]) + uid + ats
+
+
+@pytest.mark.parametrize('response, uids', [
+    (bytes([1]) + target(1, UID4), [UID4]),
+    (bytes([2]) + target(1, UID4) + target(2, UID7), [UID4, UID7]),
+    (bytes([1]) + target(1, UID7), [UID7]),
+    # ISO14443-4-Karte: ATS (erstes Byte = Länge inkl. sich selbst) wird übersprungen
+    (bytes([2]) + target(1, UID7, 0x20, bytes([5, 0x75, 0x77, 0x81, 0x02])) + target(2, UID4), [UID7, UID4]),
+    (bytes([0]), []),
+    (None, []),
+])
+def test_read_passive_targets(response, uids):
+    pn532 = StubPN532([response])
+    assert make_reader(pn532).read_passive_targets(max_targets=5, timeout=0.5) == uids
+    command, params, _ = pn532.calls[0]
+    assert command == 0x4A and params == bytes([nfc_reader.MAX_TARGETS, 0x00])  # auf zwei Karten begrenzt
+
+
+def test_target2_frames():
+    data = bytes(range(16))
+    pn532 = StubPN532([b'\x00', b'\x00' + data, b'\x00', b'\x00'])
+    reader = make_reader(pn532)
+
+    assert reader.read_block(UID4, 6, target=2) == data
+    assert reader.write_block(UID4, 6, data, target=2)
+    key = nfc_reader.DEFAULT_KEY_A
+    assert pn532.calls == [
+        (0x40, bytes([2, 0x60, 6]) + key + UID4, 1),
+        (0x40, bytes([2, 0x30, 6]), 17),
+        (0x40, bytes([2, 0x60, 6]) + key + UID4, 1),
+        (0x40, bytes([2, 0xA0, 6]) + data, 1),
+    ]
+
+
+def test_target2_error_status():
+    pn532 = StubPN532([b'\x00', b'\x14'])  # Authentifizierung ok, Lesen mit Fehlerstatus
+    assert make_reader(pn532).read_block(UID4, 6, target=2) is None
+    assert not make_reader(StubPN532([b'\x14'])).write_block(UID4, 6, bytes(16), target=2)
+
+
+class FakeTag:
+    """PN532 with one MiFare Classic card in the field (target 1), as a 1 KB image."""
+
+    def __init__(self, image):
+        self.image = bytearray(image)
+        self.calls = []
+
+    def mifare_classic_authenticate_block(self, uid, block_number, key_number, key):
+        self.calls.append(('auth', block_number))
+        return True
+
+    def mifare_classic_read_block(self, block_number):
+        self.calls.append(('read', block_number))
+        return bytes(tag_image.block(self.image, block_number))
+
+    def mifare_classic_write_block(self, block_number, data):
+        self.calls.append(('write', block_number))
+        start = block_number * tag_image.BLOCK_SIZE
+        self.image[start:start + tag_image.BLOCK_SIZE] = data
+        return True
+
+
+def test_write_image_writes_changed_data_blocks_once_per_sector():
+    current = bytes(tag_image.IMAGE_SIZE)
+    desired = bytearray(b'\xAA' * tag_image.IMAGE_SIZE)  # auch Block 0 und Trailer geändert
+    desired[5 * 16:6 * 16] = bytes(16)  # Block 5 bleibt gleich
+    tag = FakeTag(current)
+
+    written = make_reader(tag).write_image(UID4, bytes(desired), current=current)
+
+    assert 0 not in written and 5 not in written
+    assert not any(tag_image.is_trailer(block_number) for block_number in written)
+    expected = []
+    for sector in range(16):  # je Sektor eine Authentifizierung, dann dessen Blöcke
+        blocks = [block_number for block_number in written if tag_image.sector_of(block_number) == sector]
+        expected += [('auth', blocks[0])] + [('write', block_number) for block_number in blocks]
+    assert tag.calls == expected
+    assert tag.image[:16] == bytes(16)  # Herstellerblock unverändert
+
+
+def test_write_image_reads_current_image_and_rejects_wrong_size():
+    tag = FakeTag(bytes(tag_image.IMAGE_SIZE))
+    reader = make_reader(tag)
+    assert reader.write_image(UID4, bytes(tag_image.IMAGE_SIZE)) == []  # gelesen, nichts zu schreiben
+    assert len([call for call in tag.calls if call[0] == 'auth']) == 16  # read_image: einmal je Sektor
+    assert reader.write_image(UID4, bytes(100), current=bytes(tag_image.IMAGE_SIZE)) is None
@@ -0,0 +1,61 @@
+import sqlite3
+
+import pytest
+
+import database
+import production_ledger
+
+STEPS = [('State1', 100.0, 100.5, 'State2'), ('State2', 100.5, 100.75, 'State3'), ('State3', 100.75, 101.0, 'State4')]
+
+
+def events(db_path):
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute(
+        "SELECT Flaschen_ID, Station, State, Start_Time, End_Time, Outcome FROM Production_Event ORDER BY rowid"
+    ).fetchall()
+    conn.close()
+    return rows
+
+
+def test_record_cycle_and_flush(db_path):
+    db = database.Database(db_path)
+    ledger = production_ledger.EventLedger(db)
+    ledger.record_cycle('station2', 7, STEPS)
+    ledger.record_cycle('station2', 8, [])  # abgebrochener Zyklus: nichts zu melden
+
+    assert ledger.flush() == 4
+    assert ledger.flush() == 0
+    rows = events(db_path)
+    assert [row[2] for row in rows] == ['State1', 'State2', 'State3', 'cycle']
+    assert rows[-1] == (7, 'station2', 'cycle', '1970-01-01 00:01:40.000', '1970-01-01 00:01:41.000', 'State4')
+    assert production_ledger.cycle_report(db, '1970-01-01', '1970-01-02') == [
+        ('station2', 1, 1, pytest.approx(1000.0, abs=1.0), '1970-01-01 00:01:40.000', '1970-01-01 00:01:41.000')
+    ]
+
+
+def test_failed_flush_keeps_events_for_the_next_one(db_path):
+    db = database.Database(db_path)
+    db.connection().execute("PRAGMA busy_timeout = 0")
+    ledger = production_ledger.EventLedger(db)
+    ledger.record_cycle('station1', 1, STEPS[:1])
+
+    blocker = sqlite3.connect(db_path)
+    blocker.execute("BEGIN IMMEDIATE")
+    ledger.record_cycle('station1', 2, STEPS[:1])
+    with pytest.raises(sqlite3.OperationalError):
+        ledger.flush()
+    # während des Fehlschlags gemeldete Ereignisse bleiben hinter den zurückgelegten
+    ledger.record_cycle('station1', 3, STEPS[:1])
+    blocker.rollback()
+    blocker.close()
+
+    assert ledger.flush() == 6
+    assert [row[0] for row in events(db_path)] == [1, 1, 2, 2, 3, 3]
+
+
+def test_full_buffer_drops_oldest_events(db_path):
+    ledger = production_ledger.EventLedger(database.Database(db_path), max_buffer=3)
+    for flaschen_id in range(1, 4):
+        ledger.record_cycle('station3', flaschen_id, STEPS[:1])
+
+    assert [event[0] for event in ledger._buffer] == [2, 3, 3]
@@ -0,0 +1,65 @@
+import struct
+import zlib
+
+import pytest
+
+import qr_codes
+
+
+def test_payload_round_trip():
+    payload = qr_codes.encode_payload(3, 27, '2024-12-04 10:12:00')
+    assert payload == '100300000027241204101200' and len(payload) == qr_codes.PAYLOAD_LENGTH
+    assert qr_codes.decode_payload(payload) == {'rezept_id': 3, 'flaschen_id': 27, 'tagged_date': '2024-12-04 10:12:00'}
+
+
+@pytest.mark.parametrize('tagged_date', [0, None, ''])
+def test_untagged_bottle_has_zero_timestamp(tagged_date):
+    payload = qr_codes.encode_payload(999, 99999999, tagged_date)
+    assert payload.endswith('0' * 12)
+    assert qr_codes.decode_payload(payload) == {'rezept_id': 999, 'flaschen_id': 99999999, 'tagged_date': None}
+
+
+@pytest.mark.parametrize('rezept_id, flaschen_id', [(1000, 1), (-1, 1), (1, 100000000), (1, -1)])
+def test_out_of_range_ids_raise(rezept_id, flaschen_id):
+    with pytest.raises(ValueError):
+        qr_codes.encode_payload(rezept_id, flaschen_id, 0)
+
+
+@pytest.mark.parametrize('payload', ['', '2' + '0' * 23, '1' * 23, '1' * 23 + 'x'])
+def test_unsupported_payload_raises(payload):
+    with pytest.raises(ValueError):
+        qr_codes.decode_payload(payload)
+
+
+@pytest.fixture(scope='module')
+def matrix():
+    pytest.importorskip('qrcode')
+    return qr_codes.encode_matrix(qr_codes.encode_payload(999, 99999999, '2099-12-31 23:59:59'))
+
+
+def test_symbol_is_version_1(matrix):
+    size = 21 + 2 * qr_codes.BORDER  # Version 1: 21x21 Module plus Ruhezone
+    assert len(matrix) == size and all(len(row) == size for row in matrix)
+
+
+def test_png_and_raw_sizes(matrix):
+    box_size = 3
+    pixels = len(matrix) * box_size
+    row_bytes = (pixels + 7) // 8
+
+    png = qr_codes.render_png(matrix, box_size)
+    assert png.startswith(b'\x89PNG\r\n\x1a\n')
+    length, tag = struct.unpack('>I4s', png[8:16])
+    assert tag == b'IHDR' and struct.unpack('>IIBB', png[16:26]) == (pixels, pixels, 1, 0)
+    idat_start = 8 + 12 + length
+    idat_length, idat_tag = struct.unpack('>I4s', png[idat_start:idat_start + 8])
+    assert idat_tag == b'IDAT'
+    raw = zlib.decompress(png[idat_start + 8:idat_start + 8 + idat_length])
+    assert len(raw) == pixels * (1 + row_bytes)  # Filterbyte je Zeile
+
+    assert len(qr_codes.render_raw(matrix, box_size)) == pixels * row_bytes
+    # raw: 1 = schwarz; die Ruhezone oben links ist weiß, das Suchmuster danach schwarz
+    unscaled = qr_codes.render_raw(matrix, 1)
+    unscaled_row_bytes = (len(matrix) + 7) // 8
+    assert unscaled[0] == 0x00
+    assert unscaled[qr_codes.BORDER * unscaled_row_bytes] == 0x0F  # 4 Module Ruhezone, dann Suchmuster
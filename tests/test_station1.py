@@ -0,0 +1,47 @@
+import json
+import sqlite3
+
+import database
+import production_ledger
+import station1
+
+
+class FakeReader:
+    def __init__(self):
+        self.written = []
+
+    def write_block(self, uid, block_number, data, target=1):
+        self.written.append(data[0])
+        return True
+
+
+def test_restart_skips_bottles_pending_in_journal(db_path):
+    conn = sqlite3.connect(db_path)
+    conn.executemany("INSERT INTO Flasche VALUES (?, 1, 0, 0)", [(1,), (2,), (3,)])
+    conn.commit()
+    conn.close()
+
+    # Voriger Lauf: Flasche 1 getaggt, das Update steht noch im Journal
+    with open(db_path + database.JOURNAL_SUFFIX, 'w', encoding='utf-8') as f:
+        statement = [station1.TAG_QUERY, ['2024-12-04 10:00:00', 1]]
+        f.write(json.dumps({'seq': 1, 'statements': [statement]}) + '\n')
+
+    # Neustart bei gesperrter Datenbank: der Flusher kann den Eintrag noch nicht anwenden
+    db = database.Database(db_path)
+    db.connection().execute("PRAGMA busy_timeout = 0")
+    blocker = sqlite3.connect(db_path)
+    blocker.execute("BEGIN IMMEDIATE")
+    db.enable_journal(flush_interval=60)
+    machine = station1.StateMachine(db=db, ledger=production_ledger.EventLedger(db))
+    machine.reader = FakeReader()
+    machine.uid = b'\x04\x01\x02\x03'
+    machine.states['State2'].run()
+
+    assert machine.current_state == 'State3'
+    assert machine.flaschen_id == 2
+    blocker.rollback()
+    blocker.close()
+    db.close()
+    conn = sqlite3.connect(db_path)
+    assert conn.execute("SELECT Flaschen_ID FROM Flasche WHERE Tagged_Date IS NOT 0").fetchall() == [(1,)]
+    conn.close()
@@ -0,0 +1,20 @@
+import logging
+
+import database
+import metrics
+import production_ledger
+import station2
+
+
+def test_standalone_run_logs_metrics(db_path, caplog):
+    db = database.Database(db_path)
+    registry = metrics.Registry()
+    registry.observe('station2.pn532.InListPassiveTarget', 0.004)
+    machine = station2.StateMachine(db=db, registry=registry, ledger=production_ledger.EventLedger(db))
+    machine.current_state = 'State3'  # Flasche ohne Rezept: State3 -> State5 beendet run()
+
+    with caplog.at_level(logging.INFO, logger='station2'):
+        machine.run()
+
+    assert machine.current_state == 'State5'
+    assert any(message.startswith('station2.pn532.InListPassiveTarget: n=1') for message in caplog.messages)
@@ -0,0 +1,36 @@
+import pytest
+
+import tag_image
+
+
+def image_with(changes):
+    image = bytearray(tag_image.IMAGE_SIZE)
+    for block_number in changes:
+        image[block_number * tag_image.BLOCK_SIZE] = 0xFF
+    return bytes(image)
+
+
+def test_diff_skips_manufacturer_block_and_trailers():
+    every_block = image_with(range(tag_image.BLOCK_COUNT))
+    changes = tag_image.diff(bytes(tag_image.IMAGE_SIZE), every_block)
+
+    written = [block_number for block_numbers in changes.values() for block_number in block_numbers]
+    assert 0 not in written
+    assert not any(tag_image.is_trailer(block_number) for block_number in written)
+    assert len(written) == tag_image.BLOCK_COUNT - 1 - 16  # ohne Block 0 und 16 Trailer
+
+
+def test_diff_groups_changed_blocks_per_sector():
+    changes = tag_image.diff(bytes(tag_image.IMAGE_SIZE), image_with([2, 1, 9, 10, 63, 0, 7]))
+    assert changes == {0: [1, 2], 2: [9, 10]}
+    assert tag_image.diff(image_with([5]), image_with([5])) == {}
+
+
+def test_size_mismatch_raises():
+    with pytest.raises(ValueError):
+        tag_image.diff(bytes(tag_image.IMAGE_SIZE), bytes(tag_image.IMAGE_SIZE - 1))
+    with pytest.raises(ValueError):
+        tag_image.from_blocks([bytes(tag_image.BLOCK_SIZE)] * (tag_image.BLOCK_COUNT - 1))
+    blocks = [bytes([i]) * tag_image.BLOCK_SIZE for i in range(tag_image.BLOCK_COUNT)]
+    image = tag_image.from_blocks(blocks)
+    assert tag_image.block(image, 5) == blocks[5]